@@ -0,0 +1,242 @@
+"""
+Benchmark and accuracy suite for the set-membership filters.
+
+Every filter needs `add_many`, `query_many` and `memory_bytes`. `compare()`
+runs a few filters on the same keys and prints one line per filter. Running
+this file sweeps set sizes, target false positive rates, hash engines and
+layouts, and writes the results as JSON so runs can be compared across
+commits:
+
+    python bench_filters.py --sizes 10000 1000000 --fprs 0.01 0.001 \
+        --layouts bloom blocked cuckoo --output bench.json
+
+With `--check`, it exits with an error if the measured false positive rate
+of a classic Bloom filter is too far from `proba_false_positive`.
+"""
+
+import argparse
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+from typing import Callable
+
+from bloom_filters import HASH_ENGINES
+from bloom_filters import proba_false_positive
+
+LAYOUTS = ("bloom", "bloom-list", "blocked", "counting", "cuckoo")
+
+
+def measure(new_filter: Callable, keys: list[bytes], misses: list[bytes]) -> dict:
+    """
+    Build a filter with `new_filter()`, add `keys` and query both `keys` and
+    `misses` (items that were never added).
+    """
+    bloom = new_filter()
+
+    start = time.perf_counter()
+    bloom.add_many(keys)
+    add_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hits = bloom.query_many(keys)
+    hit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    false_positives = bloom.query_many(misses).sum()
+    miss_time = time.perf_counter() - start
+
+    if not hits.all():
+        raise AssertionError(f"{type(bloom).__name__} returned false negatives.")
+
+    # `proba_false_positive` models the classic layout. The blocked layout
+    # has the same parameters but a higher real rate.
+    theoretical_fpr = None
+    if hasattr(bloom, "optimal_hash_funcs"):
+        theoretical_fpr = proba_false_positive(
+            len(keys), bloom.vector_length, bloom.optimal_hash_funcs
+        )
+
+    return {
+        "filter": type(bloom).__name__,
+        "memory_bytes": bloom.memory_bytes,
+        "bytes_per_key": bloom.memory_bytes / len(keys),
+        "bits_per_key": bloom.memory_bytes * 8 / len(keys),
+        "adds_per_sec": len(keys) / add_time,
+        "hit_queries_per_sec": len(keys) / hit_time,
+        "miss_queries_per_sec": len(misses) / miss_time,
+        "fpr": false_positives / len(misses),
+        "theoretical_fpr": theoretical_fpr,
+    }
+
+
+def compare(
+    new_filters: dict[str, Callable], set_length: int, queries: int
+) -> list[dict]:
+    """
+    Run `measure` for each filter factory and print one line per filter.
+    """
+    keys = [f"key-{i}".encode() for i in range(set_length)]
+    misses = [f"miss-{i}".encode() for i in range(queries)]
+
+    results = []
+    for name, new_filter in new_filters.items():
+        result = measure(new_filter, keys, misses)
+        result["name"] = name
+        results.append(result)
+
+        print(
+            f"{name:<20} "
+            f"memory={result['memory_bytes'] / 2**20:.1f}MB "
+            f"bits/key={result['bits_per_key']:.1f} "
+            f"fpr={result['fpr']:.5f} "
+            f"adds/s={result['adds_per_sec']:,.0f} "
+            f"queries/s={result['miss_queries_per_sec']:,.0f}"
+        )
+
+    return results
+
+
+def new_filter_factory(layout: str, set_length, proba_false_positives, engine):
+    # imported here because some of these modules import this one
+    from blocked_bloom import BlockedBloomFilter
+    from bloom_filters import BloomFilter
+    from counting_bloom import CountingBloomFilter
+    from cuckoo_filter import CuckooFilter
+
+    args = (set_length, proba_false_positives)
+    factories = {
+        "bloom": lambda: BloomFilter(*args, storage="bits", hash_engine=engine),
+        "bloom-list": lambda: BloomFilter(*args, storage="list", hash_engine=engine),
+        "blocked": lambda: BlockedBloomFilter(*args, hash_engine=engine),
+        "counting": lambda: CountingBloomFilter(*args, hash_engine=engine),
+        "cuckoo": lambda: CuckooFilter(*args, hash_engine=engine),
+    }
+    return factories[layout]
+
+
+def fpr_matches(result: dict, queries: int, sigmas: float = 4) -> bool:
+    """
+    Whether the measured false positive rate is within `sigmas` standard
+    deviations (binomial, `queries` trials) of the theoretical one.
+    """
+    p = result["theoretical_fpr"]
+    tolerance = sigmas * math.sqrt(p * (1 - p) / queries) + 1 / queries
+    return abs(result["fpr"] - p) <= tolerance
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, fprs, engines, layouts, queries: int) -> list[dict]:
+    misses = [f"miss-{i}".encode() for i in range(queries)]
+    results = []
+
+    for set_length in sizes:
+        keys = [f"key-{i}".encode() for i in range(set_length)]
+
+        for target_fpr in fprs:
+            for engine in engines:
+                for layout in layouts:
+                    new_filter = new_filter_factory(
+                        layout, set_length, target_fpr, engine
+                    )
+                    try:
+                        result = measure(new_filter, keys, misses)
+                    except ValueError as e:
+                        # e.g. a cuckoo filter can't reach very low rates
+                        print(f"skipping {layout}: {e}", file=sys.stderr)
+                        continue
+
+                    result.update(
+                        layout=layout,
+                        engine=engine,
+                        set_length=set_length,
+                        target_fpr=target_fpr,
+                        queries=queries,
+                    )
+                    results.append(result)
+                    print_row(result)
+
+    return results
+
+
+def print_row(result: dict) -> None:
+    theoretical = result["theoretical_fpr"]
+    print(
+        f"{result['layout']:<10} {result['engine']:<8} "
+        f"n={result['set_length']:<9,} target={result['target_fpr']:<7} "
+        f"bytes/key={result['bytes_per_key']:6.2f} "
+        f"fpr={result['fpr']:.5f} "
+        f"theory={'-' if theoretical is None else f'{theoretical:.5f}'} "
+        f"adds/s={result['adds_per_sec']:>11,.0f} "
+        f"hits/s={result['hit_queries_per_sec']:>11,.0f} "
+        f"misses/s={result['miss_queries_per_sec']:>11,.0f}",
+        file=sys.stderr,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--fprs", type=float, nargs="+", default=[0.01, 0.001])
+    parser.add_argument(
+        "--engines", nargs="+", default=list(HASH_ENGINES), choices=list(HASH_ENGINES)
+    )
+    parser.add_argument(
+        "--layouts", nargs="+", default=["bloom", "blocked"], choices=LAYOUTS
+    )
+    parser.add_argument("--queries", type=int, default=200_000)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="fail if a classic Bloom filter doesn't match its theoretical FPR",
+    )
+    args = parser.parse_args()
+
+    results = run_suite(args.sizes, args.fprs, args.engines, args.layouts, args.queries)
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.check:
+        failed = [
+            r
+            for r in results
+            if r["layout"].startswith("bloom") and not fpr_matches(r, args.queries)
+        ]
+        for r in failed:
+            print(
+                f"FPR mismatch: {r['layout']} {r['engine']} n={r['set_length']} "
+                f"measured={r['fpr']:.5f} theoretical={r['theoretical_fpr']:.5f}",
+                file=sys.stderr,
+            )
+        if failed:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
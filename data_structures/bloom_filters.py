@@ -0,0 +1,713 @@
+"""
+The Bloom filter from `bloom_filters.ipynb`, packaged as a module so it can be
+imported from other scripts and notebooks.
+"""
+
+import math
+import mmap
+import os
+import struct
+import sys
+from hashlib import blake2b
+from itertools import islice
+from typing import Callable
+from typing import Iterable
+from typing import NamedTuple
+
+import numpy as np
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import mmh3
+except ImportError:
+    mmh3 = None
+
+# Filters with a vector at least this long use bit-packed storage by default.
+# Smaller ones keep the list of ints, which is easier to look at.
+PACKED_MIN_BITS = 4096
+
+# Number of items hashed together by `add_many` and `query_many`.
+BATCH_SIZE = 65_536
+
+# On-disk format: a fixed-size little-endian header followed by the raw bit
+# array. The header is padded to 64 bytes so the payload stays aligned to
+# 64-bit words when the file is memory-mapped.
+FILE_MAGIC = b"BLMF"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("<4sHHHxxQQQ")
+FILE_HEADER_SIZE = 64
+
+# Filter kinds stored in the file header.
+KIND_BLOOM = 1
+KIND_BLOCKED_BLOOM = 2
+KIND_XOR = 3
+
+
+def proba_false_positive(set_length, vector_length, num_hash_functions):
+    n = set_length
+    m = vector_length
+    k = num_hash_functions
+
+    return (1 - (1 - (1 / m)) ** (k * n)) ** k
+
+
+def optimal_values(set_length, proba_false_positives):
+    n = set_length
+    ln_pfp = math.log(proba_false_positives)
+    ln_2 = math.log(2)
+
+    optimal_num_hash_funcs = -(ln_pfp / ln_2)
+    optimal_vector_legth = -(n * ln_pfp / ln_2**2)
+
+    # we will use math.ceil to approximate the values to the next integer
+    return math.ceil(optimal_num_hash_funcs), math.ceil(optimal_vector_legth)
+
+
+def blake2b_digest(data: bytes) -> bytes:
+    return blake2b(data, digest_size=16).digest()
+
+
+class HashEngine:
+    """
+    Computes one 128-bit digest per item and splits it into two 64-bit
+    integers, `h1` and `h2`. All the `k` indexes come from those two:
+
+        g_i(x) = (h1(x) + i * h2(x)) % m
+
+    So an `add` or a `query` hashes the data once, instead of running sha1 and
+    md5 once per hash function like the notebook version.
+    """
+
+    def __init__(self, name: str, engine_id: int, digest: Callable[[bytes], bytes]):
+        self.name = name
+        # stable number to store the engine in serialized filters
+        self.engine_id = engine_id
+        self.digest = digest
+
+    def __repr__(self) -> str:
+        return f"HashEngine({self.name!r})"
+
+    def hashes(self, data: bytes) -> tuple[int, int]:
+        d = self.digest(data)
+        return int.from_bytes(d[:8], "little"), int.from_bytes(d[8:], "little")
+
+    def indexes(self, data: bytes, k: int, m: int) -> list[int]:
+        h1, h2 = self.hashes(data)
+        return [(h1 + n * h2) % m for n in range(k)]
+
+    def hashes_many(self, items: list[bytes]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        `h1` and `h2` for a batch of items, as two `uint64` arrays.
+        """
+        digest = self.digest
+        pairs = np.frombuffer(b"".join([digest(d) for d in items]), dtype="<u8")
+        pairs = pairs.reshape(-1, 2)
+        return pairs[:, 0], pairs[:, 1]
+
+    def indexes_many(self, items: list[bytes], k: int, m: int) -> np.ndarray:
+        """
+        Indexes for a batch of items, as a `(len(items), k)` array. Row `i`
+        is the same as `indexes(items[i], k, m)`.
+        """
+        # (h1 + n * h2) % m == (h1 % m + n * (h2 % m)) % m, and the reduced
+        # values are small enough to do the rest in int64 without overflow.
+        h1, h2 = self.hashes_many(items)
+        h1 = (h1 % np.uint64(m)).astype(np.int64)
+        h2 = (h2 % np.uint64(m)).astype(np.int64)
+        n = np.arange(k, dtype=np.int64)
+
+        return (h1[:, None] + n[None, :] * h2[:, None]) % m
+
+
+HASH_ENGINES = {
+    "blake2b": HashEngine("blake2b", 1, blake2b_digest),
+}
+
+if xxhash is not None:
+    HASH_ENGINES["xxh3"] = HashEngine("xxh3", 2, xxhash.xxh3_128_digest)
+
+if mmh3 is not None:
+    HASH_ENGINES["murmur3"] = HashEngine("murmur3", 3, mmh3.hash_bytes)
+
+
+def get_hash_engine(engine: "str | HashEngine | None" = None) -> HashEngine:
+    """
+    Return a hash engine by name. The default is the fastest one available:
+    xxh3, then murmur3, and blake2b from the standard library if neither
+    `xxhash` nor `mmh3` are installed.
+    """
+    if isinstance(engine, HashEngine):
+        return engine
+
+    if engine is None:
+        for name in ("xxh3", "murmur3", "blake2b"):
+            if name in HASH_ENGINES:
+                return HASH_ENGINES[name]
+
+    try:
+        return HASH_ENGINES[engine]
+    except KeyError:
+        raise ValueError(
+            f"Unknown hash engine: {engine!r}. Available: {', '.join(HASH_ENGINES)}"
+        ) from None
+
+
+def get_hash_engine_by_id(engine_id: int) -> HashEngine:
+    for engine in HASH_ENGINES.values():
+        if engine.engine_id == engine_id:
+            return engine
+
+    raise ValueError(f"Hash engine with id {engine_id} is not available.")
+
+
+def packed_size(length: int) -> int:
+    """
+    Bytes needed to store `length` bits, rounded up to whole 64-bit words.
+    """
+    return ((length + 63) // 64) * 8
+
+
+def popcount(words: np.ndarray) -> int:
+    """
+    Number of bits set in an array of `uint64` words.
+    """
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(words).sum(dtype=np.int64))
+    # NumPy < 2.0
+    return int(np.unpackbits(words.view(np.uint8)).sum(dtype=np.int64))
+
+
+class FilterHeader(NamedTuple):
+    kind: int
+    engine_id: int
+    k: int
+    m: int
+    count: int
+
+
+def pack_filter_header(header: FilterHeader) -> bytes:
+    """
+    The `FILE_HEADER_SIZE` bytes that go before the payload.
+    """
+    packed = FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, *header)
+    return packed.ljust(FILE_HEADER_SIZE, b"\x00")
+
+
+def parse_filter_header(buffer, source: str) -> FilterHeader:
+    """
+    Parse and validate the header at the start of `buffer`. `source` is only
+    used in error messages.
+    """
+    if len(buffer) < FILE_HEADER_SIZE:
+        raise ValueError(f"{source} is too small to be a filter file.")
+
+    magic, version, *fields = FILE_HEADER.unpack_from(buffer)
+    if magic != FILE_MAGIC:
+        raise ValueError(f"{source} is not a filter file (bad magic {magic!r}).")
+    if version != FILE_VERSION:
+        raise ValueError(
+            f"{source} uses format version {version}, expected {FILE_VERSION}."
+        )
+
+    return FilterHeader(*fields)
+
+
+def write_filter_file(path: str, header: FilterHeader, payload) -> None:
+    """
+    Write a filter file. The data goes to a temporary file that then replaces
+    `path`, so processes that have the old file mapped keep reading a
+    consistent copy.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(pack_filter_header(header))
+        f.write(payload)
+
+    os.replace(tmp_path, path)
+
+
+def map_filter_file(path: str) -> tuple[FilterHeader, mmap.mmap]:
+    """
+    Memory-map a filter file read-only and parse its header. The payload
+    starts at `FILE_HEADER_SIZE`. Pages are loaded lazily by the OS and are
+    shared between all the processes that map the same file.
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        header = parse_filter_header(mm, path)
+    except ValueError:
+        mm.close()
+        raise
+
+    return header, mm
+
+
+class FilterStats(NamedTuple):
+    """
+    Snapshot of how full a filter is, see `BloomFilter.stats()`.
+    """
+
+    count: int
+    bits_set: int
+    fill_ratio: float
+    estimated_fpr: float
+    estimated_cardinality: float
+    design_set_length: int | None
+    design_fpr: float | None
+
+    @property
+    def over_design_fpr(self) -> bool:
+        return self.design_fpr is not None and self.estimated_fpr > self.design_fpr
+
+
+class FilterMonitor:
+    """
+    Registry of named filters for a metrics exporter. Call `poll()` from the
+    exporter (e.g. a Prometheus collector or a periodic task) and turn each
+    row into gauges labelled by `name`.
+
+    `on_saturated(name, stats)` is called by `poll()` for every filter whose
+    estimated false positive rate is above `max_fpr` (by default the rate the
+    filter was built for).
+    """
+
+    def __init__(self, on_saturated: Callable[[str, FilterStats], None] | None = None):
+        self.filters = {}
+        self.on_saturated = on_saturated
+
+    def register(self, name: str, bloom, max_fpr: float | None = None) -> None:
+        self.filters[name] = (bloom, max_fpr)
+
+    def unregister(self, name: str) -> None:
+        del self.filters[name]
+
+    def poll(self) -> list[dict]:
+        rows = []
+        for name, (bloom, max_fpr) in self.filters.items():
+            stats = bloom.stats()
+            if max_fpr is None:
+                max_fpr = stats.design_fpr
+            saturated = max_fpr is not None and stats.estimated_fpr > max_fpr
+            if saturated and self.on_saturated is not None:
+                self.on_saturated(name, stats)
+
+            rows.append({"name": name, **stats._asdict(), "saturated": saturated})
+
+        return rows
+
+
+class ListVector:
+    """
+    One Python int per bit. Every position is an 8-byte pointer in the list,
+    so this is only useful for small filters.
+    """
+
+    def __init__(self, length: int):
+        self.bits = [0] * length
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    def __getitem__(self, idx: int) -> int:
+        return self.bits[idx]
+
+    def __setitem__(self, idx: int, value: int) -> None:
+        self.bits[idx] = value
+
+    def __repr__(self) -> str:
+        return repr(self.bits)
+
+    def to_bytes(self) -> bytes:
+        packed = np.packbits(np.array(self.bits, dtype=np.uint8), bitorder="little")
+        return packed.tobytes().ljust(packed_size(len(self.bits)), b"\x00")
+
+    @property
+    def words(self) -> np.ndarray:
+        """
+        Packed copy of the bits as `uint64` words, same layout as `BitVector`.
+        """
+        return np.frombuffer(self.to_bytes(), dtype=np.uint64)
+
+    def get_many(self, indexes: np.ndarray) -> np.ndarray:
+        bits = self.bits
+        return np.fromiter(
+            (bits[i] for i in indexes.flat), dtype=bool, count=indexes.size
+        ).reshape(indexes.shape)
+
+    def set_many(self, indexes: np.ndarray) -> None:
+        bits = self.bits
+        for i in indexes.flat:
+            bits[i] = 1
+
+    @property
+    def memory_bytes(self) -> int:
+        # the ints 0 and 1 are cached by CPython, only the pointers count
+        return sys.getsizeof(self.bits)
+
+
+class BitVector:
+    """
+    Bit-packed vector. Bit `i` is stored in byte `i >> 3`, at position `i & 7`.
+
+    The buffer is padded to a whole number of 64-bit words so it can also be
+    viewed as a NumPy `uint64` array with `words`. Any object supporting the
+    buffer protocol works, for example a `memoryview` of a memory-mapped file
+    (read-only buffers can be queried but not written).
+    """
+
+    def __init__(self, length: int, buffer=None):
+        self.length = length
+        if buffer is None:
+            buffer = bytearray(packed_size(length))
+        elif len(buffer) != packed_size(length):
+            raise ValueError(
+                f"Buffer has {len(buffer)} bytes, {packed_size(length)} expected."
+            )
+        self.buffer = buffer
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, idx: int) -> int:
+        return (self.buffer[idx >> 3] >> (idx & 7)) & 1
+
+    def __setitem__(self, idx: int, value: int) -> None:
+        if value:
+            self.buffer[idx >> 3] |= 1 << (idx & 7)
+        else:
+            self.buffer[idx >> 3] &= ~(1 << (idx & 7)) & 0xFF
+
+    def __repr__(self) -> str:
+        return f"BitVector(length={self.length}, memory_bytes={self.memory_bytes})"
+
+    def get_many(self, indexes: np.ndarray) -> np.ndarray:
+        """
+        Gather the bits at `indexes` (any shape) into a bool array.
+        """
+        return (
+            (self.bytes[indexes >> 3] >> (indexes & 7).astype(np.uint8)) & 1
+        ).astype(bool)
+
+    def set_many(self, indexes: np.ndarray) -> None:
+        """
+        Scatter 1s to `indexes`. `bitwise_or.at` is unbuffered, so repeated
+        indexes in the same byte don't overwrite each other.
+        """
+        bytes_view = self.bytes
+        # ufunc.at doesn't check the writeable flag, and writing to a
+        # read-only mmap would crash the process
+        if not bytes_view.flags.writeable:
+            raise TypeError("cannot modify read-only memory")
+
+        indexes = indexes.ravel()
+        masks = np.left_shift(np.uint8(1), (indexes & 7).astype(np.uint8))
+        np.bitwise_or.at(bytes_view, indexes >> 3, masks)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.buffer)
+
+    @property
+    def bytes(self) -> np.ndarray:
+        """
+        Zero-copy `uint8` view of the buffer.
+        """
+        return np.frombuffer(self.buffer, dtype=np.uint8)
+
+    @property
+    def words(self) -> np.ndarray:
+        """
+        Zero-copy `uint64` view of the buffer.
+        """
+        return np.frombuffer(self.buffer, dtype=np.uint64)
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.buffer)
+
+
+def make_vector(length: int, storage: str = "auto"):
+    if storage == "auto":
+        storage = "bits" if length >= PACKED_MIN_BITS else "list"
+
+    if storage == "bits":
+        return BitVector(length)
+    elif storage == "list":
+        return ListVector(length)
+
+    raise ValueError(f"Unknown storage: {storage!r}. Use 'auto', 'bits' or 'list'.")
+
+
+class BloomFilter:
+    # filter kind written to the file header by `save()`
+    kind = KIND_BLOOM
+
+    def __init__(
+        self,
+        set_length,
+        proba_false_positives,
+        storage: str = "auto",
+        hash_engine: "str | HashEngine | None" = None,
+    ):
+
+        self.optimal_hash_funcs, self.optimal_vec_len = self.calculate_optim_values(
+            set_length, proba_false_positives
+        )
+
+        self.vector = make_vector(self.optimal_vec_len, storage)
+
+        self.vector_length = len(self.vector)
+        self.modulo = self.vector_length
+
+        self.hash_engine = get_hash_engine(hash_engine)
+
+        # number of items added (duplicates included)
+        self.count = 0
+
+        # what the filter was sized for, unknown when built with `from_vector`
+        self.design_set_length = set_length
+        self.design_fpr = proba_false_positives
+
+        # set when the vector lives in a memory-mapped file, see `load()`
+        self._mmap = None
+
+    @classmethod
+    def from_vector(cls, vector, k: int, hash_engine, count: int = 0):
+        """
+        Build a filter around an existing vector, skipping the sizing step.
+        """
+        bloom = cls.__new__(cls)
+        bloom.optimal_hash_funcs = k
+        bloom.optimal_vec_len = len(vector)
+        bloom.vector = vector
+        bloom.vector_length = len(vector)
+        bloom.modulo = bloom.vector_length
+        bloom.hash_engine = get_hash_engine(hash_engine)
+        bloom.count = count
+        bloom.design_set_length = None
+        bloom.design_fpr = None
+        bloom._mmap = None
+        return bloom
+
+    def calculate_optim_values(self, set_length, proba_false_positives):
+        return optimal_values(set_length, proba_false_positives)
+
+    def save(self, path: str) -> None:
+        """
+        Write the filter to `path`, it can be opened again with `load()`.
+        """
+        header = FilterHeader(
+            kind=self.kind,
+            engine_id=self.hash_engine.engine_id,
+            k=self.optimal_hash_funcs,
+            m=self.vector_length,
+            count=self.count,
+        )
+        write_filter_file(path, header, self.vector.to_bytes())
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Open a filter written by `save()`. The file is memory-mapped
+        read-only, so there is no load step: `query` reads the bits straight
+        from the page cache, and processes opening the same file share it.
+        Adding items to a loaded filter raises an error.
+        """
+        header, mm = map_filter_file(path)
+        if header.kind != cls.kind:
+            mm.close()
+            raise ValueError(f"{path} does not contain a {cls.__name__}.")
+
+        payload = memoryview(mm)[
+            FILE_HEADER_SIZE : FILE_HEADER_SIZE + packed_size(header.m)
+        ]
+        vector = BitVector(header.m, buffer=payload)
+        bloom = cls.from_vector(
+            vector,
+            header.k,
+            get_hash_engine_by_id(header.engine_id),
+            count=header.count,
+        )
+        bloom._mmap = mm
+        return bloom
+
+    def close(self) -> None:
+        """
+        Unmap the file of a filter opened with `load()`.
+        """
+        if self._mmap is not None:
+            self.vector.buffer.release()
+            self._mmap.close()
+            self._mmap = None
+
+    def check_compatible(self, other: "BloomFilter") -> None:
+        """
+        Raise `ValueError` unless `other` has the same layout, `k`, `m` and
+        hash engine, i.e. the same item sets the same bits in both filters.
+        """
+        mismatches = []
+        if type(self) is not type(other):
+            mismatches.append(f"type {type(self).__name__} != {type(other).__name__}")
+        if self.optimal_hash_funcs != other.optimal_hash_funcs:
+            mismatches.append(
+                f"k {self.optimal_hash_funcs} != {other.optimal_hash_funcs}"
+            )
+        if self.vector_length != other.vector_length:
+            mismatches.append(f"m {self.vector_length} != {other.vector_length}")
+        if self.hash_engine.engine_id != other.hash_engine.engine_id:
+            mismatches.append(
+                f"hash engine {self.hash_engine.name} != {other.hash_engine.name}"
+            )
+
+        if mismatches:
+            raise ValueError(f"Incompatible filters: {', '.join(mismatches)}.")
+
+    def _combine(self, other: "BloomFilter", op, count: int) -> "BloomFilter":
+        self.check_compatible(other)
+        vector = BitVector(self.vector_length)
+        op(self.vector.words, other.vector.words, out=vector.words)
+        return self.from_vector(
+            vector, self.optimal_hash_funcs, self.hash_engine, count=count
+        )
+
+    def union(self, other: "BloomFilter") -> "BloomFilter":
+        """
+        Filter with the items of both filters. It is exactly the filter we
+        would get by adding all the items to a single filter.
+        """
+        return self._combine(other, np.bitwise_or, self.count + other.count)
+
+    def intersection(self, other: "BloomFilter") -> "BloomFilter":
+        """
+        Filter that matches the items found in both filters. Its false
+        positive rate can be higher than the one of a filter built only from
+        the common items. `count` is an upper bound.
+        """
+        return self._combine(other, np.bitwise_and, min(self.count, other.count))
+
+    def update(self, other: "BloomFilter") -> None:
+        """
+        In-place `union`. A filter with the list storage is switched to the
+        bit-packed one first.
+        """
+        self.check_compatible(other)
+        if not isinstance(self.vector, BitVector):
+            # `ListVector.words` is a read-only copy
+            self.vector = BitVector(
+                self.vector_length, buffer=bytearray(self.vector.to_bytes())
+            )
+        words = self.vector.words
+        if not words.flags.writeable:
+            raise TypeError("cannot modify read-only memory")
+        np.bitwise_or(words, other.vector.words, out=words)
+        self.count += other.count
+
+    @property
+    def memory_bytes(self) -> int:
+        """
+        Bytes used by the bit vector.
+        """
+        return self.vector.memory_bytes
+
+    def stats(self) -> FilterStats:
+        """
+        Fill ratio and the estimates derived from it. This is a popcount over
+        the whole vector (about 1ms per 10MB with the bit-packed storage), so
+        it's meant to be polled, not called on every query.
+
+        With `X` bits set out of `m`, the false positive rate is `(X / m) **
+        k`, and the number of distinct items is about `-m / k * ln(1 - X / m)`
+        (Swamidass and Baldi, 2007). Unlike `count`, the estimate ignores
+        duplicates, and it also works for filters built with `union`.
+        """
+        m = self.vector_length
+        k = self.optimal_hash_funcs
+        bits_set = popcount(self.vector.words)
+        fill_ratio = bits_set / m
+
+        if bits_set < m:
+            estimated_cardinality = -m / k * math.log1p(-fill_ratio)
+        else:
+            estimated_cardinality = math.inf
+
+        return FilterStats(
+            count=self.count,
+            bits_set=bits_set,
+            fill_ratio=fill_ratio,
+            estimated_fpr=fill_ratio**k,
+            estimated_cardinality=estimated_cardinality,
+            design_set_length=self.design_set_length,
+            design_fpr=self.design_fpr,
+        )
+
+    def add(self, data: bytes):
+        indexes = self.hash_engine.indexes(data, self.optimal_hash_funcs, self.modulo)
+
+        for idx in indexes:
+            self.vector[idx] = 1
+
+        self.count += 1
+        return indexes
+
+    def add_faster(self, data: bytes) -> None:
+        h1, h2 = self.hash_engine.hashes(data)
+        vector = self.vector
+        m = self.modulo
+
+        for n in range(self.optimal_hash_funcs):
+            vector[(h1 + n * h2) % m] = 1
+
+        self.count += 1
+        return
+
+    def hash_many(self, items: list[bytes]) -> np.ndarray:
+        """
+        Indexes for a batch of items, as a `(len(items), k)` array. Row `i`
+        has the same indexes that `add(items[i])` would return.
+        """
+        return self.hash_engine.indexes_many(
+            items, self.optimal_hash_funcs, self.modulo
+        )
+
+    def add_many(self, items: Iterable[bytes]) -> None:
+        """
+        Add every item of `items`, `BATCH_SIZE` items at a time.
+        """
+        items = iter(items)
+        while batch := list(islice(items, BATCH_SIZE)):
+            self.vector.set_many(self.hash_many(batch))
+            self.count += len(batch)
+
+    def query_many(self, items: Iterable[bytes]) -> np.ndarray:
+        """
+        Vectorized `query`. Returns a bool array with one value per item.
+        """
+        results = []
+        items = iter(items)
+        while batch := list(islice(items, BATCH_SIZE)):
+            results.append(self.vector.get_many(self.hash_many(batch)).all(axis=1))
+
+        if not results:
+            return np.zeros(0, dtype=bool)
+        return np.concatenate(results)
+
+    def query(self, data: bytes) -> bool:
+        """
+        This method returns `False` if the element
+        is not in the set. Otherwise it returns
+        `True` (the element may or may not be in the set)
+        """
+        h1, h2 = self.hash_engine.hashes(data)
+        vector = self.vector
+        m = self.modulo
+
+        for n in range(self.optimal_hash_funcs):
+            if vector[(h1 + n * h2) % m] == 0:
+                return False
+
+        return True
@@ -0,0 +1,184 @@
+"""
+Build a filter from a key file that doesn't fit in memory.
+
+Two formats are supported:
+
+- "lines": one key per line. Empty lines are skipped, and with Windows line
+  endings the carriage return stays at the end of the key.
+- "prefixed": each key is a 4-byte little-endian length followed by the key
+  bytes, so keys can contain newlines.
+
+The file is read in big chunks and keys are split as `bytes`, never decoded,
+and fed to `add_many` one chunk at a time. Memory use depends on the chunk
+size, not on the file size.
+
+    python bulk_load.py keys.txt --fpr 0.001 --output keys.bloom
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+from typing import Callable
+from typing import Iterator
+
+from bloom_filters import BloomFilter
+
+CHUNK_SIZE = 16 * 2**20
+
+KEY_LENGTH = struct.Struct("<I")
+
+
+def iter_lines(f, chunk_size: int = CHUNK_SIZE) -> Iterator[list[bytes]]:
+    """
+    Lists of keys from a newline-delimited binary file.
+    """
+    rest = b""
+    while chunk := f.read(chunk_size):
+        keys = (rest + chunk).split(b"\n")
+        # the last piece can be an incomplete line
+        rest = keys.pop()
+        yield [key for key in keys if key]
+
+    if rest:
+        yield [rest]
+
+
+def iter_prefixed(f, chunk_size: int = CHUNK_SIZE) -> Iterator[list[bytes]]:
+    """
+    Lists of keys from a length-prefixed binary file.
+    """
+    rest = b""
+    while chunk := f.read(chunk_size):
+        buffer = rest + chunk
+        view = memoryview(buffer)
+        keys = []
+        pos = 0
+        while pos + KEY_LENGTH.size <= len(buffer):
+            (length,) = KEY_LENGTH.unpack_from(buffer, pos)
+            end = pos + KEY_LENGTH.size + length
+            if end > len(buffer):
+                break
+            keys.append(bytes(view[pos + KEY_LENGTH.size : end]))
+            pos = end
+
+        rest = buffer[pos:]
+        view.release()
+        yield keys
+
+    if rest:
+        raise ValueError(f"Truncated key at the end of the file ({len(rest)} bytes).")
+
+
+READERS = {"lines": iter_lines, "prefixed": iter_prefixed}
+
+
+def count_keys(path: str, format: str = "lines", chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Number of keys in the file. For "lines" this only counts newlines, so
+    empty lines are included and the result can be a bit high, which is fine
+    to size a filter.
+    """
+    with open(path, "rb") as f:
+        if format == "prefixed":
+            return sum(len(keys) for keys in iter_prefixed(f, chunk_size))
+
+        count = 0
+        last = b"\n"
+        while chunk := f.read(chunk_size):
+            count += chunk.count(b"\n")
+            last = chunk[-1:]
+
+    # the last line doesn't have to end with a newline
+    return count + (last != b"\n")
+
+
+def write_prefixed(f, keys) -> None:
+    for key in keys:
+        f.write(KEY_LENGTH.pack(len(key)))
+        f.write(key)
+
+
+def load(
+    path: str,
+    proba_false_positives,
+    set_length: int | None = None,
+    format: str = "lines",
+    chunk_size: int = CHUNK_SIZE,
+    progress: Callable[[int, int, int], None] | None = None,
+    cls=BloomFilter,
+    **filter_kwargs,
+):
+    """
+    Build a filter with the keys in `path`. If `set_length` isn't given, the
+    file is read once first to count the keys.
+
+    `progress(bytes_read, total_bytes, keys_added)` is called after every
+    chunk.
+    """
+    if format not in READERS:
+        raise ValueError(f"Unknown format: {format!r}. Use one of {list(READERS)}.")
+
+    if set_length is None:
+        set_length = max(count_keys(path, format, chunk_size), 1)
+
+    bloom = cls(set_length, proba_false_positives, **filter_kwargs)
+    total_bytes = os.path.getsize(path)
+    keys_added = 0
+
+    with open(path, "rb") as f:
+        for keys in READERS[format](f, chunk_size):
+            bloom.add_many(keys)
+            keys_added += len(keys)
+            if progress is not None:
+                progress(f.tell(), total_bytes, keys_added)
+
+    return bloom
+
+
+def print_progress(bytes_read: int, total_bytes: int, keys_added: int) -> None:
+    percent = 100 * bytes_read / total_bytes if total_bytes else 100
+    print(
+        f"\r{percent:5.1f}% {bytes_read / 2**20:,.0f}MB {keys_added:,} keys",
+        end="",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build a Bloom filter from a file.")
+    parser.add_argument("path")
+    parser.add_argument("--fpr", type=float, default=0.001)
+    parser.add_argument("--set-length", type=int)
+    parser.add_argument("--format", choices=list(READERS), default="lines")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--output", help="save the filter here")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    bloom = load(
+        args.path,
+        args.fpr,
+        set_length=args.set_length,
+        format=args.format,
+        chunk_size=args.chunk_size,
+        progress=print_progress,
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"\n{bloom.count:,} keys in {elapsed:.1f}s "
+        f"({bloom.count / elapsed:,.0f} keys/s), "
+        f"{bloom.memory_bytes / 2**20:.1f}MB",
+        file=sys.stderr,
+    )
+
+    if args.output:
+        bloom.save(args.output)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
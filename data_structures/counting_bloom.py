@@ -0,0 +1,193 @@
+"""
+Counting Bloom filter. Every position of the vector is a 4-bit counter
+instead of a bit, so items can be removed as well as added.
+
+Two counters are packed in each byte, so the filter takes 4x the memory of
+the bit-packed `BloomFilter` with the same `set_length` and
+`proba_false_positives`.
+"""
+
+from itertools import islice
+from typing import Iterable
+
+import numpy as np
+
+from bloom_filters import BATCH_SIZE
+from bloom_filters import get_hash_engine
+from bloom_filters import optimal_values
+
+COUNTER_MAX = 15
+
+
+class NibbleCounters:
+    """
+    4-bit saturating counters. Counter `i` is the low half of byte `i >> 1`
+    if `i` is even, and the high half if it is odd.
+    """
+
+    def __init__(self, length: int):
+        self.length = length
+        self.buffer = bytearray((length + 1) // 2)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, idx: int) -> int:
+        return (self.buffer[idx >> 1] >> ((idx & 1) << 2)) & 0xF
+
+    def __setitem__(self, idx: int, value: int) -> None:
+        shift = (idx & 1) << 2
+        byte = self.buffer[idx >> 1]
+        self.buffer[idx >> 1] = (byte & ~(0xF << shift) & 0xFF) | (value << shift)
+
+    def __repr__(self) -> str:
+        return f"NibbleCounters(length={self.length}, memory_bytes={self.memory_bytes})"
+
+    @property
+    def bytes(self) -> np.ndarray:
+        return np.frombuffer(self.buffer, dtype=np.uint8)
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.buffer)
+
+    def get_many(self, indexes: np.ndarray) -> np.ndarray:
+        shifts = ((indexes & 1) << 2).astype(np.uint8)
+        return (self.bytes[indexes >> 1] >> shifts) & 0xF
+
+    def add_many(self, indexes: np.ndarray) -> int:
+        """
+        Increment the counter at each index (an index can be repeated).
+        Returns the number of increments lost because a counter was already
+        at `COUNTER_MAX`.
+        """
+        unique, increments = np.unique(indexes.ravel(), return_counts=True)
+        total = self.get_many(unique).astype(np.int64) + increments
+        overflows = int(np.maximum(total - COUNTER_MAX, 0).sum())
+        values = np.minimum(total, COUNTER_MAX).astype(np.uint8)
+
+        # the two counters of a byte can both be in `unique`, so low and
+        # high halves are written in two separate steps
+        bytes_view = self.bytes
+        odd = (unique & 1).astype(bool)
+        low, high = unique[~odd] >> 1, unique[odd] >> 1
+        bytes_view[low] = (bytes_view[low] & 0xF0) | values[~odd]
+        bytes_view[high] = (bytes_view[high] & 0x0F) | (values[odd] << 4)
+
+        return overflows
+
+    def saturated(self) -> int:
+        """
+        Number of counters stuck at `COUNTER_MAX`.
+        """
+        bytes_view = self.bytes
+        return int(
+            np.count_nonzero((bytes_view & 0xF) == COUNTER_MAX)
+            + np.count_nonzero((bytes_view >> 4) == COUNTER_MAX)
+        )
+
+
+class CountingBloomFilter:
+    """
+    Same sizing and hashing as `BloomFilter`, plus `remove()`.
+
+    Counters saturate at 15. A saturated counter is never decremented again
+    (we don't know how many increments it lost), so removing items can't
+    cause false negatives. The cost is that those positions stay set forever.
+    `overflows` counts the lost increments.
+    """
+
+    def __init__(self, set_length, proba_false_positives, hash_engine=None):
+
+        self.optimal_hash_funcs, self.optimal_vec_len = self.calculate_optim_values(
+            set_length, proba_false_positives
+        )
+
+        self.vector = NibbleCounters(self.optimal_vec_len)
+
+        self.vector_length = len(self.vector)
+        self.modulo = self.vector_length
+
+        self.hash_engine = get_hash_engine(hash_engine)
+
+        # items currently in the filter (added minus removed)
+        self.count = 0
+        self.overflows = 0
+
+    def calculate_optim_values(self, set_length, proba_false_positives):
+        return optimal_values(set_length, proba_false_positives)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.vector.memory_bytes
+
+    def _indexes(self, data: bytes) -> list[int]:
+        return self.hash_engine.indexes(data, self.optimal_hash_funcs, self.modulo)
+
+    def add(self, data: bytes):
+        vector = self.vector
+        indexes = self._indexes(data)
+
+        for idx in indexes:
+            value = vector[idx]
+            if value == COUNTER_MAX:
+                self.overflows += 1
+            else:
+                vector[idx] = value + 1
+
+        self.count += 1
+        return indexes
+
+    def add_many(self, items: Iterable[bytes]) -> None:
+        items = iter(items)
+        while batch := list(islice(items, BATCH_SIZE)):
+            indexes = self.hash_engine.indexes_many(
+                batch, self.optimal_hash_funcs, self.modulo
+            )
+            self.overflows += self.vector.add_many(indexes)
+            self.count += len(batch)
+
+    def remove(self, data: bytes) -> None:
+        """
+        Remove an item. Raises `KeyError` if the item is definitely not in
+        the filter (decrementing in that case could create false negatives).
+
+        Only remove items that were added: removing a false positive takes
+        away counts that belong to other items.
+        """
+        vector = self.vector
+        indexes = self._indexes(data)
+
+        if any(vector[idx] == 0 for idx in indexes):
+            raise KeyError(data)
+
+        for idx in indexes:
+            value = vector[idx]
+            if value != COUNTER_MAX:
+                vector[idx] = value - 1
+
+        self.count -= 1
+
+    def query(self, data: bytes) -> bool:
+        vector = self.vector
+        for idx in self._indexes(data):
+            if vector[idx] == 0:
+                return False
+
+        return True
+
+    def query_many(self, items: Iterable[bytes]) -> np.ndarray:
+        results = []
+        items = iter(items)
+        while batch := list(islice(items, BATCH_SIZE)):
+            indexes = self.hash_engine.indexes_many(
+                batch, self.optimal_hash_funcs, self.modulo
+            )
+            results.append((self.vector.get_many(indexes) > 0).all(axis=1))
+
+        if not results:
+            return np.zeros(0, dtype=bool)
+        return np.concatenate(results)
+
+    def saturated_counters(self) -> int:
+        return self.vector.saturated()
@@ -0,0 +1,153 @@
+"""
+Build a big `BloomFilter` with several processes.
+
+The keys are split in chunks and sent to the workers through a queue. Every
+worker adds its chunks to one empty filter with the same `k`, `m` and hash
+engine, kept for the whole build, and sends its bits back once at the end.
+The parent merges the `workers` partial bit arrays with a bitwise OR. Adding
+an item only sets bits, so the result is exactly the filter we would get
+adding every key in one process.
+
+Each worker holds a full copy of the bits, so the build needs `workers + 1`
+times the size of the filter in memory, but the bits only cross processes
+once per worker, however many keys there are.
+"""
+
+import multiprocessing
+import os
+import queue
+import time
+from itertools import islice
+from typing import Iterable
+
+import numpy as np
+
+from bloom_filters import BitVector
+from bloom_filters import BloomFilter
+
+# keys sent to a worker per task
+CHUNK_SIZE = 1_000_000
+
+
+# how often the parent checks that the workers are still alive while it
+# waits on a queue, in seconds
+POLL_INTERVAL = 1.0
+
+
+def _build_partial(cls, k: int, m: int, engine_name: str, tasks, results) -> None:
+    bloom = cls.from_vector(BitVector(m), k, engine_name)
+    while (keys := tasks.get()) is not None:
+        bloom.add_many(keys)
+    results.put(bloom.vector.buffer)
+
+
+def _check_workers(processes: list) -> None:
+    for process in processes:
+        if process.exitcode not in (None, 0):
+            raise RuntimeError(
+                f"Worker {process.pid} exited with code {process.exitcode}."
+            )
+
+
+def _put(tasks, item, processes: list) -> None:
+    # a plain `put` would block for ever on a full queue if a worker died
+    while True:
+        try:
+            tasks.put(item, timeout=POLL_INTERVAL)
+            return
+        except queue.Full:
+            _check_workers(processes)
+
+
+def _get(results, processes: list):
+    while True:
+        try:
+            return results.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            _check_workers(processes)
+
+
+def build_parallel(
+    keys: Iterable[bytes],
+    set_length,
+    proba_false_positives,
+    workers: int | None = None,
+    chunk_size: int = CHUNK_SIZE,
+    hash_engine=None,
+    cls=BloomFilter,
+) -> BloomFilter:
+    """
+    Same as `cls(set_length, proba_false_positives).add_many(keys)`, using
+    `workers` processes (all the CPUs by default).
+
+    `keys` is consumed lazily: at most two chunks per worker wait in the
+    queue, so memory doesn't grow with the number of keys.
+    """
+    bloom = cls(
+        set_length, proba_false_positives, storage="bits", hash_engine=hash_engine
+    )
+    workers = workers or os.cpu_count()
+    words = bloom.vector.words
+    params = (
+        cls,
+        bloom.optimal_hash_funcs,
+        bloom.vector_length,
+        bloom.hash_engine.name,
+    )
+
+    tasks = multiprocessing.Queue(maxsize=2 * workers)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=_build_partial, args=(*params, tasks, results), daemon=True
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        keys = iter(keys)
+        while chunk := list(islice(keys, chunk_size)):
+            _put(tasks, chunk, processes)
+            bloom.count += len(chunk)
+
+        # one `None` per worker: each one stops after its first
+        for _ in processes:
+            _put(tasks, None, processes)
+
+        # read the results before joining, a process doesn't exit until its
+        # queued data has been consumed
+        for _ in processes:
+            partial = np.frombuffer(_get(results, processes), dtype=np.uint64)
+            np.bitwise_or(words, partial, out=words)
+
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    return bloom
+
+
+def bench(set_length=4_000_000, proba_false_positives=0.001):
+    keys = [f"key-{i}".encode() for i in range(set_length)]
+
+    start = time.perf_counter()
+    single = BloomFilter(set_length, proba_false_positives)
+    single.add_many(keys)
+    print(f"add_many:         {time.perf_counter() - start:.2f}s")
+
+    workers = 1
+    while workers <= os.cpu_count():
+        start = time.perf_counter()
+        bloom = build_parallel(keys, set_length, proba_false_positives, workers=workers)
+        print(f"{workers:>2} workers:       {time.perf_counter() - start:.2f}s")
+        assert bloom.vector.buffer == single.vector.buffer
+        workers *= 2
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,130 @@
+"""
+Scalable Bloom filter: a chain of `BloomFilter`s that grows when the current
+one is full, instead of letting the false positive rate climb.
+
+Based on "Scalable Bloom Filters" (Almeida et al., 2007). Sub-filter `i` has
+capacity `set_length * growth ** i` and a false positive rate of
+`p0 * tightening ** i`. The rates form a geometric series, so the rate of the
+whole chain stays below `p0 / (1 - tightening)`. We pick `p0` so that this
+bound is the `proba_false_positives` we were asked for.
+"""
+
+from itertools import islice
+from typing import Iterable
+
+import numpy as np
+
+from bloom_filters import BloomFilter
+from bloom_filters import get_hash_engine
+
+
+class ScalableBloomFilter:
+    def __init__(
+        self,
+        set_length,
+        proba_false_positives,
+        growth: int = 2,
+        tightening: float = 0.5,
+        storage: str = "auto",
+        hash_engine=None,
+    ):
+        if not 0 < tightening < 1:
+            raise ValueError("tightening must be between 0 and 1.")
+        if growth < 1:
+            raise ValueError("growth must be at least 1.")
+
+        self.initial_set_length = set_length
+        self.proba_false_positives = proba_false_positives
+        self.growth = growth
+        self.tightening = tightening
+        self.storage = storage
+        self.hash_engine = get_hash_engine(hash_engine)
+
+        self.filters: list[BloomFilter] = []
+        self.capacities: list[int] = []
+        self.error_rates: list[float] = []
+        self._grow()
+
+    def _grow(self) -> BloomFilter:
+        i = len(self.filters)
+        capacity = self.initial_set_length * self.growth**i
+        error_rate = (
+            self.proba_false_positives * (1 - self.tightening) * self.tightening**i
+        )
+
+        bloom = BloomFilter(
+            capacity,
+            error_rate,
+            storage=self.storage,
+            hash_engine=self.hash_engine,
+        )
+        self.filters.append(bloom)
+        self.capacities.append(capacity)
+        self.error_rates.append(error_rate)
+        return bloom
+
+    def _current(self) -> BloomFilter:
+        """
+        The filter new items go to, adding a new one if the last is full.
+        """
+        bloom = self.filters[-1]
+        if bloom.count >= self.capacities[-1]:
+            bloom = self._grow()
+        return bloom
+
+    @property
+    def count(self) -> int:
+        return sum(bloom.count for bloom in self.filters)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(bloom.memory_bytes for bloom in self.filters)
+
+    @property
+    def max_proba_false_positives(self) -> float:
+        """
+        Upper bound of the false positive rate with the current sub-filters
+        (each one filled up to its capacity).
+        """
+        p_none = 1.0
+        for error_rate in self.error_rates:
+            p_none *= 1 - error_rate
+        return 1 - p_none
+
+    def add(self, data: bytes):
+        return self._current().add(data)
+
+    def add_faster(self, data: bytes) -> None:
+        self._current().add_faster(data)
+
+    def add_many(self, items: Iterable[bytes]) -> None:
+        items = iter(items)
+        while True:
+            bloom = self._current()
+            room = self.capacities[-1] - bloom.count
+            batch = list(islice(items, room))
+            if not batch:
+                return
+            bloom.add_many(batch)
+
+    def query(self, data: bytes) -> bool:
+        # the newest filter is the biggest one and holds most of the items,
+        # so we start there
+        for bloom in reversed(self.filters):
+            if bloom.query(data):
+                return True
+
+        return False
+
+    def query_many(self, items: Iterable[bytes]) -> np.ndarray:
+        items = list(items)
+        found = np.zeros(len(items), dtype=bool)
+
+        for bloom in reversed(self.filters):
+            # only look for the items we haven't found yet
+            pending = np.flatnonzero(~found)
+            if pending.size == 0:
+                break
+            found[pending] = bloom.query_many([items[i] for i in pending])
+
+        return found
@@ -0,0 +1,236 @@
+"""
+Bloom filter in `multiprocessing.shared_memory`, so several processes (e.g.
+the uvicorn workers of a FastAPI app) use one copy of the bits and see each
+other's `add`s.
+
+The segment has the same layout as a filter file (see `bloom_filters.py`):
+header first, then the bits. Any process can attach to it by name and read
+`k`, `m` and the hash engine from the header.
+
+Setting a bit is a read-modify-write of a whole byte. If two processes set
+different bits of the same byte at the same time, one of the writes can be
+lost, and that would be a false negative. So writers take an exclusive
+`flock` on a lock file next to the segment. `flock` only excludes other open
+file descriptions, not the threads of a process sharing this one (e.g. the
+thread pool FastAPI runs sync endpoints in), so writers also hold a
+`threading.Lock` per instance. Readers never lock: bits only go from 0 to 1,
+so a reader can only miss an `add` that hasn't returned yet.
+"""
+
+import fcntl
+import os
+import struct
+import tempfile
+import threading
+import time
+from itertools import islice
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+from typing import Iterable
+
+import numpy as np
+
+from bloom_filters import BATCH_SIZE
+from bloom_filters import FILE_HEADER
+from bloom_filters import FILE_HEADER_SIZE
+from bloom_filters import KIND_BLOOM
+from bloom_filters import BitVector
+from bloom_filters import BloomFilter
+from bloom_filters import FilterHeader
+from bloom_filters import get_hash_engine
+from bloom_filters import get_hash_engine_by_id
+from bloom_filters import optimal_values
+from bloom_filters import pack_filter_header
+from bloom_filters import packed_size
+from bloom_filters import parse_filter_header
+
+# `count` is the last field of the header
+COUNT = struct.Struct("<Q")
+COUNT_OFFSET = FILE_HEADER.size - COUNT.size
+
+# how long `attach` waits for the creator to write the header
+ATTACH_TIMEOUT = 1.0
+
+
+def _open_segment(name: str, create: bool = False, size: int = 0):
+    """
+    Python < 3.13 registers every segment with the resource tracker, which
+    unlinks it when *any* process that opened it exits. The segment has to
+    outlive the workers, so we unregister it and leave `unlink()` to the
+    owner.
+    """
+    try:
+        return shared_memory.SharedMemory(
+            name=name, create=create, size=size, track=False
+        )
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SharedBloomFilter:
+    def __init__(self, shm: shared_memory.SharedMemory, header: FilterHeader):
+        self.shm = shm
+        self.name = shm.name
+
+        payload = shm.buf[FILE_HEADER_SIZE : FILE_HEADER_SIZE + packed_size(header.m)]
+        self.bloom = BloomFilter.from_vector(
+            BitVector(header.m, buffer=payload),
+            header.k,
+            get_hash_engine_by_id(header.engine_id),
+        )
+
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{self.name}.lock")
+        self._lock_fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        # the `flock` is held by the fd, every thread using it would get it
+        self._thread_lock = threading.Lock()
+
+    @classmethod
+    def create(
+        cls, name: str, set_length, proba_false_positives, hash_engine=None
+    ) -> "SharedBloomFilter":
+        """
+        Create a new, empty segment. Raises `FileExistsError` if `name` is
+        taken.
+        """
+        k, m = optimal_values(set_length, proba_false_positives)
+        return cls._create(name, k, m, get_hash_engine(hash_engine), payload=None)
+
+    @classmethod
+    def from_filter(cls, name: str, bloom: BloomFilter) -> "SharedBloomFilter":
+        """
+        Create a segment with a copy of an existing filter, e.g. one built at
+        startup.
+        """
+        return cls._create(
+            name,
+            bloom.optimal_hash_funcs,
+            bloom.vector_length,
+            bloom.hash_engine,
+            payload=bloom.vector.to_bytes(),
+            count=bloom.count,
+        )
+
+    @classmethod
+    def _create(cls, name, k, m, hash_engine, payload, count=0):
+        size = FILE_HEADER_SIZE + packed_size(m)
+        shm = _open_segment(name, create=True, size=size)
+
+        # bits first: attaching processes wait until the header is there
+        if payload is not None:
+            shm.buf[FILE_HEADER_SIZE:size] = payload
+        header = FilterHeader(
+            kind=KIND_BLOOM,
+            engine_id=hash_engine.engine_id,
+            k=k,
+            m=m,
+            count=count,
+        )
+        shm.buf[:FILE_HEADER_SIZE] = pack_filter_header(header)
+
+        return cls(shm, header)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedBloomFilter":
+        """
+        Attach to a segment created by another process.
+        """
+        shm = _open_segment(name)
+
+        deadline = time.monotonic() + ATTACH_TIMEOUT
+        while True:
+            try:
+                header = parse_filter_header(shm.buf, f"Shared memory {name!r}")
+                break
+            except ValueError:
+                # the creator may not have written the header yet
+                if time.monotonic() > deadline:
+                    shm.close()
+                    raise
+                time.sleep(0.01)
+
+        if header.kind != KIND_BLOOM:
+            shm.close()
+            raise ValueError(f"Shared memory {name!r} does not contain a Bloom filter.")
+
+        return cls(shm, header)
+
+    @classmethod
+    def create_or_attach(
+        cls, name: str, set_length, proba_false_positives, hash_engine=None
+    ) -> "SharedBloomFilter":
+        """
+        For code that runs in every worker: the first one creates the
+        segment, the rest attach to it.
+        """
+        try:
+            return cls.create(name, set_length, proba_false_positives, hash_engine)
+        except FileExistsError:
+            return cls.attach(name)
+
+    @property
+    def count(self) -> int:
+        return COUNT.unpack_from(self.shm.buf, COUNT_OFFSET)[0]
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.bloom.memory_bytes
+
+    def stats(self):
+        # `count` lives in the segment header, not in `self.bloom`
+        return self.bloom.stats()._replace(count=self.count)
+
+    def _locked_set(self, indexes: np.ndarray, added: int) -> None:
+        with self._thread_lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                self.bloom.vector.set_many(indexes)
+                COUNT.pack_into(self.shm.buf, COUNT_OFFSET, self.count + added)
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def add(self, data: bytes):
+        bloom = self.bloom
+        # hash outside the lock, only the writes need it
+        indexes = bloom.hash_engine.indexes(
+            data, bloom.optimal_hash_funcs, bloom.modulo
+        )
+        self._locked_set(np.array(indexes, dtype=np.int64), 1)
+        return indexes
+
+    def add_faster(self, data: bytes) -> None:
+        self.add(data)
+
+    def add_many(self, items: Iterable[bytes]) -> None:
+        items = iter(items)
+        while batch := list(islice(items, BATCH_SIZE)):
+            self._locked_set(self.bloom.hash_many(batch), len(batch))
+
+    def query(self, data: bytes) -> bool:
+        return self.bloom.query(data)
+
+    def query_many(self, items: Iterable[bytes]) -> np.ndarray:
+        return self.bloom.query_many(items)
+
+    def close(self) -> None:
+        """
+        Detach this process. The segment stays until `unlink()`.
+        """
+        self.bloom.vector.buffer.release()
+        self.shm.close()
+        os.close(self._lock_fd)
+
+    def unlink(self) -> None:
+        """
+        Delete the segment. Processes still attached keep their mapping.
+        """
+        if not hasattr(self.shm, "_track"):
+            # Python < 3.13 unregisters the segment in `unlink()`, and we
+            # already did that in `_open_segment`
+            resource_tracker.register(self.shm._name, "shared_memory")
+        self.shm.unlink()
+        try:
+            os.unlink(self._lock_path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,159 @@
+"""
+Sliding-window Bloom filter, to remember items only for a while (e.g. dedup
+events from the last N minutes).
+
+The filter is a ring of `generations` Bloom filters. New items go to the
+newest one, queries look at all of them. When the newest generation is full,
+or when `generation_seconds` have passed, the oldest generation is cleared
+and becomes the newest. Clearing zeroes the `m / 64` words of its bit array,
+no allocation or rebuild, so memory stays the same however many items
+arrive.
+
+An item is remembered for at least `generations - 1` and at most
+`generations` generations.
+"""
+
+import time
+from itertools import islice
+from typing import Callable
+from typing import Iterable
+
+import numpy as np
+
+from bloom_filters import BloomFilter
+
+
+class SlidingBloomFilter:
+    def __init__(
+        self,
+        generation_length,
+        proba_false_positives,
+        generations: int = 4,
+        generation_seconds: float | None = None,
+        hash_engine=None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        `generation_length` is the number of items a generation holds.
+        `proba_false_positives` is for a query across all the generations, so
+        each one is built with `proba_false_positives / generations`.
+        """
+        if generations < 2:
+            raise ValueError("A sliding window needs at least 2 generations.")
+
+        self.generation_length = generation_length
+        self.generation_seconds = generation_seconds
+        self.clock = clock
+
+        self.filters = [
+            BloomFilter(
+                generation_length,
+                proba_false_positives / generations,
+                storage="bits",
+                hash_engine=hash_engine,
+            )
+            for _ in range(generations)
+        ]
+        # index of the newest generation in `filters`
+        self.current = 0
+        self.rotations = 0
+        self.started_at = clock()
+
+    @property
+    def generations(self) -> int:
+        return len(self.filters)
+
+    @property
+    def count(self) -> int:
+        return sum(bloom.count for bloom in self.filters)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(bloom.memory_bytes for bloom in self.filters)
+
+    def live(self) -> list[BloomFilter]:
+        """
+        Generations from newest to oldest.
+        """
+        n = self.generations
+        return [self.filters[(self.current - i) % n] for i in range(n)]
+
+    def rotate(self) -> None:
+        """
+        Drop the oldest generation and start a new, empty one.
+        """
+        self.current = (self.current + 1) % self.generations
+        bloom = self.filters[self.current]
+        bloom.vector.words.fill(0)
+        bloom.count = 0
+        self.rotations += 1
+        self.started_at = self.clock()
+
+    def _expire(self) -> None:
+        if self.generation_seconds is None:
+            return
+
+        elapsed = self.clock() - self.started_at
+        # after a long pause several generations can be due at once, but
+        # there is nothing left to clear after a full turn
+        due = min(int(elapsed // self.generation_seconds), self.generations)
+        for _ in range(due):
+            self.rotate()
+
+    def _newest(self) -> BloomFilter:
+        """
+        Generation new items go to, rotating first if it's full or expired.
+        """
+        self._expire()
+        bloom = self.filters[self.current]
+        if bloom.count >= self.generation_length:
+            self.rotate()
+            bloom = self.filters[self.current]
+        return bloom
+
+    def add(self, data: bytes):
+        return self._newest().add(data)
+
+    def add_faster(self, data: bytes) -> None:
+        self._newest().add_faster(data)
+
+    def add_many(self, items: Iterable[bytes]) -> None:
+        items = iter(items)
+        while True:
+            bloom = self._newest()
+            batch = list(islice(items, self.generation_length - bloom.count))
+            if not batch:
+                return
+            bloom.add_many(batch)
+
+    def query(self, data: bytes) -> bool:
+        self._expire()
+        for bloom in self.live():
+            if bloom.query(data):
+                return True
+
+        return False
+
+    def query_many(self, items: Iterable[bytes]) -> np.ndarray:
+        self._expire()
+        items = list(items)
+        found = np.zeros(len(items), dtype=bool)
+
+        for bloom in self.live():
+            pending = np.flatnonzero(~found)
+            if pending.size == 0:
+                break
+            found[pending] = bloom.query_many([items[i] for i in pending])
+
+        return found
+
+    def seen(self, data: bytes) -> bool:
+        """
+        Dedup helper: `True` if `data` was (probably) seen in the window,
+        otherwise add it and return `False`.
+        """
+        if self.query(data):
+            return True
+
+        self.add_faster(data)
+        return False
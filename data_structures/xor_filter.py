@@ -0,0 +1,286 @@
+"""
+Xor filter ("Xor Filters: Faster and Smaller Than Bloom and Cuckoo Filters",
+Graf and Lemire, 2019) for sets that are built once and then only queried.
+
+The filter is an array of `1.23 * n + 32` fingerprints split in three
+segments. Every key maps to one slot in each segment, and the construction
+picks the fingerprints so that, for every key in the set:
+
+    fingerprint(key) == B[h0(key)] ^ B[h1(key)] ^ B[h2(key)]
+
+A query is always three probes. With 8-bit fingerprints the false positive
+rate is 1/256 using ~9.8 bits per key (a Bloom filter needs ~11.5 bits for
+the same rate), with 16-bit fingerprints it is 1/65536.
+
+Keys can't be added after the filter is built.
+"""
+
+import math
+from itertools import islice
+from typing import Iterable
+
+import numpy as np
+
+from bloom_filters import BATCH_SIZE
+from bloom_filters import FILE_HEADER_SIZE
+from bloom_filters import KIND_XOR
+from bloom_filters import FilterHeader
+from bloom_filters import get_hash_engine
+from bloom_filters import get_hash_engine_by_id
+from bloom_filters import map_filter_file
+from bloom_filters import write_filter_file
+
+MASK_64 = 2**64 - 1
+MASK_32 = 2**32 - 1
+
+# construction fails with a small probability, then we try another seed
+MAX_ATTEMPTS = 100
+
+TYPECODES = {8: ("B", np.uint8), 16: ("H", np.uint16)}
+
+
+def mix64(h: int) -> int:
+    """
+    MurmurHash3 finalizer.
+    """
+    h ^= h >> 33
+    h = (h * 0xFF51AFD7ED558CCD) & MASK_64
+    h ^= h >> 33
+    h = (h * 0xC4CEB9FE1A85EC53) & MASK_64
+    h ^= h >> 33
+    return h
+
+
+def rotl64(h: int, r: int) -> int:
+    return ((h << r) | (h >> (64 - r))) & MASK_64
+
+
+def rotl64_many(h: np.ndarray, r: int) -> np.ndarray:
+    return (h << np.uint64(r)) | (h >> np.uint64(64 - r))
+
+
+def mix64_many(h: np.ndarray) -> np.ndarray:
+    # same as `mix64`, uint64 multiplication already wraps around
+    h = h ^ (h >> np.uint64(33))
+    h = h * np.uint64(0xFF51AFD7ED558CCD)
+    h = h ^ (h >> np.uint64(33))
+    h = h * np.uint64(0xC4CEB9FE1A85EC53)
+    return h ^ (h >> np.uint64(33))
+
+
+class XorFilter:
+    def __init__(
+        self,
+        fingerprints: memoryview,
+        fingerprint_bits: int,
+        seed: int,
+        hash_engine,
+        count: int,
+    ):
+        """
+        Use `XorFilter.build()` or `XorFilter.load()`.
+        """
+        self.fingerprints = fingerprints
+        self.fingerprint_bits = fingerprint_bits
+        self.dtype = TYPECODES[fingerprint_bits][1]
+        self.seed = seed
+        self.hash_engine = get_hash_engine(hash_engine)
+        self.count = count
+
+        self.capacity = len(fingerprints)
+        self.segment_length = self.capacity // 3
+        self._mmap = None
+
+    @staticmethod
+    def capacity_for(count: int) -> int:
+        capacity = 32 + math.ceil(1.23 * count)
+        return capacity + (-capacity % 3)
+
+    @classmethod
+    def build(
+        cls, keys: Iterable[bytes], fingerprint_bits: int = 8, hash_engine=None
+    ) -> "XorFilter":
+        """
+        Build a filter with all the keys of the set. Duplicated keys are fine.
+        """
+        if fingerprint_bits not in TYPECODES:
+            raise ValueError(f"fingerprint_bits must be one of {list(TYPECODES)}.")
+        typecode, dtype = TYPECODES[fingerprint_bits]
+        hash_engine = get_hash_engine(hash_engine)
+
+        hashes = []
+        keys = iter(keys)
+        while batch := list(islice(keys, BATCH_SIZE)):
+            hashes.append(hash_engine.hashes_many(batch)[0])
+        hashes = np.unique(np.concatenate(hashes or [np.zeros(0, np.uint64)]))
+
+        capacity = cls.capacity_for(len(hashes))
+        for seed in range(MAX_ATTEMPTS):
+            fingerprints = _construct(hashes, capacity, seed, fingerprint_bits)
+            if fingerprints is not None:
+                break
+        else:
+            raise ValueError(f"Couldn't build the filter in {MAX_ATTEMPTS} attempts.")
+
+        buffer = memoryview(bytearray(fingerprints.astype(dtype).tobytes()))
+        return cls(
+            buffer.cast(typecode), fingerprint_bits, seed, hash_engine, len(hashes)
+        )
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.fingerprints.nbytes
+
+    @property
+    def bits_per_key(self) -> float:
+        return self.memory_bytes * 8 / max(self.count, 1)
+
+    def _slots(self, data: bytes) -> tuple[int, int, int, int]:
+        h = mix64((self.hash_engine.hashes(data)[0] + self.seed) & MASK_64)
+        n = self.segment_length
+        fingerprint = (h ^ (h >> 32)) & ((1 << self.fingerprint_bits) - 1)
+        # ((x & 0xFFFFFFFF) * n) >> 32 maps x to [0, n) without a modulo
+        s0 = ((h & MASK_32) * n) >> 32
+        s1 = n + (((rotl64(h, 21) & MASK_32) * n) >> 32)
+        s2 = 2 * n + (((rotl64(h, 42) & MASK_32) * n) >> 32)
+        return fingerprint, s0, s1, s2
+
+    def query(self, data: bytes) -> bool:
+        fingerprint, s0, s1, s2 = self._slots(data)
+        b = self.fingerprints
+        return fingerprint == b[s0] ^ b[s1] ^ b[s2]
+
+    def query_many(self, items: Iterable[bytes]) -> np.ndarray:
+        table = np.frombuffer(self.fingerprints, dtype=self.dtype)
+
+        results = []
+        items = iter(items)
+        while batch := list(islice(items, BATCH_SIZE)):
+            h1 = self.hash_engine.hashes_many(batch)[0]
+            fingerprints, slots = _slots_many(
+                h1, self.seed, self.segment_length, self.fingerprint_bits
+            )
+            stored = table[slots[:, 0]] ^ table[slots[:, 1]] ^ table[slots[:, 2]]
+            results.append(stored == fingerprints)
+
+        if not results:
+            return np.zeros(0, dtype=bool)
+        return np.concatenate(results)
+
+    def save(self, path: str) -> None:
+        """
+        Same file format as `BloomFilter.save()`. In the header, `k` is the
+        fingerprint size in bits and `m` the number of fingerprints. The
+        payload is the 8-byte seed followed by the fingerprints.
+        """
+        header = FilterHeader(
+            kind=KIND_XOR,
+            engine_id=self.hash_engine.engine_id,
+            k=self.fingerprint_bits,
+            m=self.capacity,
+            count=self.count,
+        )
+        payload = self.seed.to_bytes(8, "little") + self.fingerprints.tobytes()
+        write_filter_file(path, header, payload)
+
+    @classmethod
+    def load(cls, path: str) -> "XorFilter":
+        """
+        Memory-map a filter written by `save()`.
+        """
+        header, mm = map_filter_file(path)
+        if header.kind != KIND_XOR:
+            mm.close()
+            raise ValueError(f"{path} does not contain a {cls.__name__}.")
+
+        typecode, dtype = TYPECODES[header.k]
+        start = FILE_HEADER_SIZE + 8
+        view = memoryview(mm)
+        seed = int.from_bytes(view[FILE_HEADER_SIZE:start], "little")
+        fingerprints = view[start : start + header.m * np.dtype(dtype).itemsize]
+
+        xor_filter = cls(
+            fingerprints.cast(typecode),
+            header.k,
+            seed,
+            get_hash_engine_by_id(header.engine_id),
+            header.count,
+        )
+        xor_filter._mmap = mm
+        view.release()
+        return xor_filter
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self.fingerprints.release()
+            self._mmap.close()
+            self._mmap = None
+
+
+def _slots_many(
+    h1: np.ndarray, seed: int, segment_length: int, fingerprint_bits: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized `XorFilter._slots`: fingerprints and a `(len(h1), 3)` array
+    of slots.
+    """
+    h = mix64_many(h1 + np.uint64(seed))
+    n = np.uint64(segment_length)
+    mask = np.uint64(MASK_32)
+    shift = np.uint64(32)
+
+    fingerprints = (h ^ (h >> shift)) & np.uint64((1 << fingerprint_bits) - 1)
+    slots = np.empty((len(h), 3), dtype=np.int64)
+    slots[:, 0] = ((h & mask) * n) >> shift
+    slots[:, 1] = segment_length + ((rotl64_many(h, 21) & mask) * n >> shift)
+    slots[:, 2] = 2 * segment_length + ((rotl64_many(h, 42) & mask) * n >> shift)
+    return fingerprints, slots
+
+
+def _construct(hashes: np.ndarray, capacity: int, seed: int, fingerprint_bits: int):
+    """
+    Peel the 3-hypergraph of keys and slots, then assign the fingerprints in
+    reverse order. Returns `None` if the graph can't be fully peeled.
+
+    A slot used by a single key can be assigned last, after the other two
+    slots of that key are fixed. We remove ("peel") those keys round by round.
+    All the keys peeled in the same round own different slots, so each round
+    is done with NumPy at once.
+    """
+    fingerprints, slots = _slots_many(hashes, seed, capacity // 3, fingerprint_bits)
+
+    # for each slot: how many keys use it, and the XOR of their indexes. When
+    # the count is 1 the XOR is the index of the only key left.
+    counts = np.zeros(capacity, dtype=np.int64)
+    xors = np.zeros(capacity, dtype=np.int64)
+    key_ids = np.arange(len(hashes), dtype=np.int64)
+    for j in range(3):
+        np.add.at(counts, slots[:, j], 1)
+        np.bitwise_xor.at(xors, slots[:, j], key_ids)
+
+    rounds = []
+    peeled = 0
+    while peeled < len(hashes):
+        singles = np.flatnonzero(counts == 1)
+        if singles.size == 0:
+            return None
+
+        # a key can be alone in two of its slots, keep one of them
+        keys, first = np.unique(xors[singles], return_index=True)
+        owned = singles[first]
+        rounds.append((keys, owned))
+        peeled += len(keys)
+
+        for j in range(3):
+            np.subtract.at(counts, slots[keys, j], 1)
+            np.bitwise_xor.at(xors, slots[keys, j], keys)
+
+    table = np.zeros(capacity, dtype=np.uint64)
+    for keys, owned in reversed(rounds):
+        # the owned slot is still 0 here, so it doesn't change the XOR
+        ks = slots[keys]
+        table[owned] = (
+            fingerprints[keys] ^ table[ks[:, 0]] ^ table[ks[:, 1]] ^ table[ks[:, 2]]
+        )
+
+    return table
@@ -1,14 +1,22 @@
+import os
 import random
+from contextlib import asynccontextmanager
 
 # import MappingProxyType for frozen dict
 from types import MappingProxyType
 
 import uvicorn
 from fastapi import FastAPI
+from fastapi import Form
 from fastapi.responses import HTMLResponse
 from lxml.html import HtmlElement
 from lxml.html import tostring
 from lxml.html.builder import E as e
+from starlette.concurrency import run_in_threadpool
+
+from render_pool import InlineRenderer
+from render_pool import make_renderer
+from users import UserDirectory
 
 # jinaj2 doesn't autoescape
 # https://jinja.palletsprojects.com/en/3.1.x/templates/#html-escaping
@@ -30,7 +38,25 @@ def gen_par(text: str) -> HtmlElement:
     )
 
 
-app = FastAPI()
+# set RENDER_WORKERS to render pages in a pool of processes
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", "0"))
+renderer = InlineRenderer()
+
+# user table and the Bloom filter of its emails, built in the lifespan so
+# the render processes, which import this module, don't build their own
+users = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global renderer, users
+    users = UserDirectory.demo()
+    renderer = make_renderer(RENDER_WORKERS, preload=[__name__])
+    yield
+    renderer.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 State = dict | MappingProxyType
@@ -122,26 +148,42 @@ class Views:
         return e.ul(*[e.li(item) for item in self.state["items"]])
 
 
+def view_index(state: State):
+    # module-level function, so the render pool can pickle it
+    return Views(state).index()
+
+
 @app.get("/", response_class=HTMLResponse)
-def idx():
+async def idx():
     items = [str(random.randint(0, 100)) for _ in range(10)]
     state = {
         "title": "Some title",
         "items": items,
         "user": "Ricardo",
     }
-    views = Views(MappingProxyType(state))
-    html = s(views.index())
-    return html
+    return HTMLResponse(await renderer.render(view_index, state))
 
 
 @app.get("/error", response_class=HTMLResponse)
-def idx2():
+async def idx2():
     items = [str(random.randint(0, 100)) for _ in range(10)]
     state = {"title": "Some title", "items": items, "error": True}
-    views = Views(MappingProxyType(state))
-    html = s(views.index())
-    return html
+    return HTMLResponse(await renderer.render(view_index, state))
+
+
+@app.post("/login", response_class=HTMLResponse)
+async def post_login(email: str = Form()):
+    # unknown emails are (almost always) rejected by the Bloom filter without
+    # querying the store
+    items = [str(random.randint(0, 100)) for _ in range(10)]
+    state = {
+        "title": "Some title",
+        "items": items,
+        "user": email,
+    }
+    if not await run_in_threadpool(users.exists, email):
+        state["error"] = True
+    return HTMLResponse(await renderer.render(view_index, state))
 
 
 if __name__ == "__main__":
@@ -9,16 +9,28 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
 from lxml.html import HtmlElement
+from lxml.html import fragments_fromstring
 from lxml.html import html_parser
 from lxml.html import tostring
+from markupsafe import Markup
 from markupsafe import escape
 
 _QName = ET.QName
 
 
+def _append(elem, item):
+    elem.append(item)
+
+
 # Copied from the original LXML source code, added a call to `escape` before
-# generating the text. It doesn't generate useful elements, it's just to
-# showcase how this could eventually be done.
+# generating the text. The typemap lookup is cached per type, and `e.tag`
+# makers per tag.
+#
+# lxml escapes text when it serializes the tree, so the escaped `Markup` isn't
+# stored as text (that would escape it twice, `a<b` -> `a&amp;lt;b`). It's
+# parsed back instead: escaped strings become their original text, and
+# `Markup` built elsewhere (HTML that is already safe) becomes elements. For
+# plain strings the output is the same as with `lxml.html.builder.E`.
 class ElementMaker:
     """Element generator factory.
 
@@ -119,12 +131,17 @@ class ElementMaker:
         typemap = dict(typemap) if typemap else {}
 
         def add_text(elem, item):
-            try:
+            # `len()` instead of catching IndexError
+            if len(elem):
                 last_child = elem[-1]
-            except IndexError:
-                elem.text = (elem.text or "") + item
+                if last_child.tail is None:
+                    last_child.tail = item
+                else:
+                    last_child.tail = last_child.tail + item
+            elif elem.text is None:
+                elem.text = item
             else:
-                last_child.tail = (last_child.tail or "") + item
+                elem.text = elem.text + item
 
         def add_cdata(elem, cdata):
             if elem.text:
@@ -134,8 +151,20 @@ class ElementMaker:
                 )
             elem.text = cdata
 
+        def add_markup(elem, item):
+            if "<" not in item:
+                add_text(elem, item.unescape())
+                return
+            for part in fragments_fromstring(str(item)):
+                if isinstance(part, str):
+                    add_text(elem, part)
+                else:
+                    elem.append(part)
+
         if str not in typemap:
             typemap[str] = add_text
+        if Markup not in typemap:
+            typemap[Markup] = add_markup
         if ET.CDATA not in typemap:
             typemap[ET.CDATA] = add_cdata
 
@@ -151,9 +180,35 @@ class ElementMaker:
             typemap[dict] = add_dict
 
         self._typemap = typemap
+        # type -> handler, filled by `_resolve` as new types show up
+        self._dispatch = {}
+        # handler for plain strings
+        self._add_text = self._resolve(str)
+
+    def _resolve(self, cls: type):
+        """
+        Handler for children of type `cls`, looked up once per type: exact
+        type, then elements, then the first base class in the typemap.
+        """
+        t = self._typemap.get(cls)
+        if t is None:
+            if issubclass(cls, ET._Element):
+                t = _append
+            else:
+                for basetype in cls.__mro__:
+                    t = self._typemap.get(basetype)
+                    if t is not None:
+                        break
+                else:
+                    return None
+
+        self._dispatch[cls] = t
+        return t
 
     def __call__(self, tag, *children, **attrib):
         typemap = self._typemap
+        dispatch = self._dispatch
+        add_text = self._add_text
 
         # We'll usually get a 'str', and the compiled type check is very fast.
         if not isinstance(tag, str) and isinstance(tag, _QName):
@@ -166,37 +221,38 @@ class ElementMaker:
             typemap[dict](elem, attrib)
 
         for item in children:
+            # most children are strings, skip the checks below for them.
+            # Parsing `escape(item)` back gives `item`, so add it as is.
+            if type(item) is str:
+                add_text(elem, item)
+                continue
+
             if callable(item):
                 item = item()
             # escape all the strings by default
             if isinstance(item, str):
                 item = escape(item)
-            print(f"item1: {item}")
-            t = typemap.get(type(item))
-            print(f"t1: {t}")
+
+            cls = type(item)
+            t = dispatch.get(cls) or self._resolve(cls)
             if t is None:
-                if ET.iselement(item):
-                    elem.append(item)
-                    continue
-                for basetype in type(item).__mro__:
-                    # See if the typemap knows of any of this type's bases.
-                    t = typemap.get(basetype)
-                    if t is not None:
-                        break
-                else:
-                    raise TypeError(
-                        "bad argument type: %s(%r)" % (type(item).__name__, item)
-                    )
+                raise TypeError(
+                    "bad argument type: %s(%r)" % (type(item).__name__, item)
+                )
 
             v = t(elem, item)
-            print(f"item: {item}, type: {type(item)}, t: {t}, v: {v}")
             if v:
                 typemap.get(type(v))(elem, v)
 
         return elem
 
     def __getattr__(self, tag):
-        return partial(self, tag)
+        # only called the first time, then `e.tag` is a plain attribute
+        if tag.startswith("__"):
+            raise AttributeError(tag)
+        maker = partial(self, tag)
+        self.__dict__[tag] = maker
+        return maker
 
 
 e = ElementMaker(makeelement=html_parser.makeelement)
@@ -10,13 +10,19 @@ from types import MappingProxyType
 
 import uvicorn
 from fastapi import FastAPI
+from fastapi import Form
 from fastapi.responses import HTMLResponse
 from lxml.html import HtmlElement
 from lxml.html import tostring
 from lxml.html.builder import E as e
 
+from users import UserDirectory
+
 app = FastAPI()
 
+# user table and the Bloom filter of its emails, built at startup
+users = UserDirectory.demo()
+
 
 State = dict | MappingProxyType
 
@@ -132,6 +138,21 @@ def idx2():
     return html
 
 
+@app.post("/login", response_class=HTMLResponse)
+def post_login(email: str = Form()):
+    # unknown emails are (almost always) rejected by the Bloom filter without
+    # querying the store
+    items = [str(random.randint(0, 100)) for _ in range(10)]
+    state = {
+        "title": "Some title",
+        "items": items,
+    }
+    if not users.exists(email):
+        state["error"] = True
+    html = s(view_index(MappingProxyType(state)))
+    return html
+
+
 if __name__ == "__main__":
     uvicorn.run(
         f'{__file__.split("/")[-1].replace(".py", "")}:app',
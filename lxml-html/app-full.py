@@ -2,16 +2,30 @@ import random
 
 # import MappingProxyType for "frozen dict"
 from types import MappingProxyType
+from typing import Iterable
+from typing import Iterator
 
 import uvicorn
 from fastapi import FastAPI
+from fastapi import Form
+from fastapi import Query
 from fastapi.responses import HTMLResponse
+from fastapi.responses import StreamingResponse
+from lxml import etree
 from lxml.html import HtmlElement
 from lxml.html import tostring
 from lxml.html.builder import E as e
 
+from compiled import compile_view
+from compiled import repeat
+from compiled import slot
+from users import UserDirectory
+
 app = FastAPI()
 
+# user table and the Bloom filter of its emails, built at startup
+users = UserDirectory.demo()
+
 # Type alias. State can be a dict or a MappingProxyType.
 State = dict | MappingProxyType
 
@@ -105,6 +119,74 @@ def list_items(state: State):
     return e.ul(*[e.li(item) for item in state["items"]])
 
 
+# number of <li> written between two flushes of a streamed page
+STREAM_CHUNK_ITEMS = 1000
+# largest `n` of `/stream`, so one request can't keep a worker busy for ever
+STREAM_MAX_ITEMS = 1_000_000
+
+
+class ChunkBuffer:
+    """
+    File-like object for `etree.htmlfile` that keeps what was written until
+    we take it.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data: bytes) -> None:
+        self.chunks.append(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_index(state: State, items: Iterable[str]) -> Iterator[bytes]:
+    """
+    Same HTML as `s(view_index(state))`, written with lxml's incremental
+    serializer. The `<head>` is sent first, then the list items in chunks of
+    `STREAM_CHUNK_ITEMS`, so the whole list is never in memory.
+    """
+    buffer = ChunkBuffer()
+    with etree.htmlfile(buffer, encoding="utf-8") as xf:
+        xf.write_doctype("<!DOCTYPE html>")
+        with xf.element("html", ATTR(lang="en")):
+            xf.write(head(state))
+            xf.flush()
+            yield buffer.take()
+
+            with xf.element("body"), xf.element(
+                "main", ATTR(id="main", _class="container")
+            ):
+                xf.write(
+                    e.section(
+                        e.h1("Page built using lxml"),
+                        e.p("This is some text."),
+                    )
+                )
+                with xf.element("ul"):
+                    for i, item in enumerate(items, 1):
+                        xf.write(e.li(item))
+                        if i % STREAM_CHUNK_ITEMS == 0:
+                            xf.flush()
+                            yield buffer.take()
+
+                xf.write(login_form(state))
+
+    yield buffer.take()
+
+
+# `view_index` compiled once, with and without the error message. Rendering
+# fills the slots instead of building and serializing a new tree.
+SLOTS = {"title": slot("title"), "items": repeat("items"), "user": slot("user")}
+INDEX_PAGES = {
+    False: compile_view(view_index, SLOTS),
+    True: compile_view(view_index, {**SLOTS, "error": True}),
+}
+
+
 @app.get("/", response_class=HTMLResponse)
 def idx(error: bool = False):
     items = [str(random.randint(0, 100)) for _ in range(4)]
@@ -113,11 +195,33 @@ def idx(error: bool = False):
         "items": items,
         "user": "@polyrand",
     }
-    if error:
-        state["error"] = True
-    tree = view_index(MappingProxyType(state))
-    html = s(tree)
-    return html
+    return HTMLResponse(INDEX_PAGES[error].render(**state))
+
+
+@app.post("/login", response_class=HTMLResponse)
+def post_login(email: str = Form()):
+    # unknown emails are (almost always) rejected by the Bloom filter without
+    # querying the store
+    items = [str(random.randint(0, 100)) for _ in range(4)]
+    state = {
+        "title": "Some title",
+        "items": items,
+        "user": email,
+    }
+    error = not users.exists(email)
+    return HTMLResponse(INDEX_PAGES[error].render(**state))
+
+
+@app.get("/stream")
+def stream(n: int = Query(10_000, ge=0, le=STREAM_MAX_ITEMS)):
+    items = (str(random.randint(0, 100)) for _ in range(n))
+    state = {
+        "title": "Some title",
+        "user": "@polyrand",
+    }
+    return StreamingResponse(
+        stream_index(MappingProxyType(state), items), media_type="text/html"
+    )
 
 
 if __name__ == "__main__":
@@ -1,12 +1,39 @@
+"""
+Rendering benchmark for the ways of building the same page: Jinja, lxml's
+builder, the cached and custom builders, the string builder and the compiled
+chunks. For every list size and backend it measures the time per render, the
+peak memory allocated by Python (tracemalloc doesn't see libxml2's own
+allocations, so the tree itself isn't counted) and the size of the output.
+
+Before timing anything it checks that all the backends produce the same
+HTML, ignoring whitespace-only text.
+
+    python bench.py --sizes 10 1000 100000 --backends lxml string --output bench.json
+"""
+
+import argparse
+import importlib
+import json
+import platform
 import random
-from functools import lru_cache
+import sys
+import time
+import tracemalloc
 
 import jinja2
+from lxml import etree
 from lxml.html import HtmlElement
+from lxml.html import document_fromstring
 from lxml.html import tostring
 from lxml.html.builder import E as e
 
-items = [str(random.randint(0, 100)) for _ in range(100)]
+import string_builder
+from compiled import compile_view
+from compiled import repeat
+from memo_builder import MemoBuilder
+
+# ElementMaker that escapes strings with markupsafe
+custom = importlib.import_module("app-custom-elem-maker")
 
 jinja_template = jinja2.Template(
     """
@@ -30,7 +57,9 @@ jinja_template = jinja2.Template(
     </main>
 </body>
 </html>
-"""
+""",
+    # the lxml backends escape the items too
+    autoescape=True,
 )
 
 
@@ -82,42 +111,63 @@ def generate_jinja_recreate_template(items: list) -> str:
     </main>
 </body>
 </html>
-"""
+""",
+        autoescape=True,
     ).render(title="Home", items=items)
 
 
-def generate_lxml(items: list) -> str:
-    return s(
-        e.html(
-            ATTR(lang="en"),
-            e.head(
-                e.meta(charset="utf-8"),
-                e.title("Home"),
-                e.meta(name="viewport", content="width=device-width, initial-scale=1"),
-                e.meta(name="description", content="Welcome."),
-                e.meta(name="author", content="@polyrand"),
-                e.link(
-                    rel="stylesheet",
-                    href="/static/style.css",
-                ),
+def page(items: list, e=e):
+    """
+    The page of `jinja_template`, built with any `E`-like builder.
+    """
+    return e.html(
+        ATTR(lang="en"),
+        e.head(
+            e.meta(charset="utf-8"),
+            e.title("Home"),
+            e.meta(name="viewport", content="width=device-width, initial-scale=1"),
+            e.meta(name="description", content="Welcome."),
+            e.meta(name="author", content="@polyrand"),
+            e.link(
+                rel="stylesheet",
+                href="/static/style.css",
             ),
-            e.body(
-                e.main(
-                    ATTR(id="main", _class="container"),
-                    e.ol(*[e.li(item) for item in items]),
-                ),
+        ),
+        e.body(
+            e.main(
+                ATTR(id="main", _class="container"),
+                e.ol(*[e.li(item) for item in items]),
             ),
-        )
+        ),
     )
 
 
-@lru_cache(maxsize=10000)
-def mk(el: str, *args, **kwargs) -> HtmlElement:
-    # mkf is "maker function". i.e: the function that would
-    # generate the element `el`
-    # e.li  ->  li_maker = getattr(e, "li")
-    mkf = getattr(e, el)
-    return mkf(*args, **kwargs)
+def generate_lxml(items: list) -> str:
+    return s(page(items))
+
+
+def generate_lxml_custom(items: list) -> str:
+    return s(page(items, e=custom.e))
+
+
+def generate_string(items: list) -> str:
+    return string_builder.s(page(items, e=string_builder.E))
+
+
+# `page` compiled once into static chunks, see compiled.py
+compiled_page = compile_view(
+    lambda state: page(state["items"]), {"items": repeat("items")}
+)
+
+
+def generate_compiled(items: list) -> str:
+    return compiled_page.render(items=items).decode()
+
+
+# mk("li", ...) is e.li(...), returning a copy of a cached element. An
+# `lru_cache` would return the same element every time, and lxml moves an
+# element when it's appended to another tree.
+mk = MemoBuilder(maxsize=10000)
 
 
 # Generate component using LXML cached builder.
@@ -156,19 +206,146 @@ def generate_lxml_cache(items: list) -> str:
     )
 
 
-# Run this inside IPython
-"""
-%run bench.py
+BACKENDS = {
+    "jinja": generate_jinja,
+    "jinja-recreate-template": generate_jinja_recreate_template,
+    "lxml": generate_lxml,
+    "lxml-custom": generate_lxml_custom,
+    "lxml-cache": generate_lxml_cache,
+    "string": generate_string,
+    "compiled": generate_compiled,
+}
 
-print("Jinja")
-%timeit generate_jinja(items)
 
-print("Jinja recreate template")
-%timeit generate_jinja_recreate_template(items)
+def normalize(html: str) -> str:
+    """
+    Parse and serialize again without whitespace-only text, so the
+    indentation of the Jinja template doesn't count as a difference.
+    """
+    tree = document_fromstring(html)
+    for el in tree.iter():
+        if el.text is not None and not el.text.strip():
+            el.text = None
+        if el.tail is not None and not el.tail.strip():
+            el.tail = None
+    return tostring(tree, encoding="unicode")
 
-print("LXML")
-%timeit generate_lxml(items)
 
-print("LXML cached builder")
-%timeit generate_lxml_cache(items)
-"""
+# items for the equivalence check, some of them need escaping
+CHECK_ITEMS = [str(i) for i in range(10)] + ["<a&b>", '"quoted"', "it's", "&amp;"]
+
+
+def check_equivalent(backends: dict, items: list) -> list[str]:
+    """
+    Names of the backends whose HTML differs from `generate_lxml`'s.
+    """
+    expected = normalize(generate_lxml(items))
+    return [
+        name
+        for name, generate in backends.items()
+        if normalize(generate(items)) != expected
+    ]
+
+
+def time_per_render(generate, items: list, repeat: int, min_time: float) -> float:
+    """
+    Best of `repeat` runs, each one calling `generate` until `min_time`
+    seconds have passed.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            generate(items)
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = min(best, elapsed / calls)
+    return best
+
+
+def peak_memory(generate, items: list) -> int:
+    tracemalloc.start()
+    try:
+        generate(items)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes, backends: dict, repeat: int, min_time: float) -> list[dict]:
+    rng = random.Random(0)
+    results = []
+    for size in sizes:
+        items = [str(rng.randint(0, 100)) for _ in range(size)]
+        for name, generate in backends.items():
+            result = {
+                "backend": name,
+                "items": size,
+                "seconds_per_render": time_per_render(
+                    generate, items, repeat, min_time
+                ),
+                "peak_memory_bytes": peak_memory(generate, items),
+                "output_bytes": len(generate(items).encode()),
+            }
+            results.append(result)
+            print_row(result)
+
+    return results
+
+
+def print_row(result: dict) -> None:
+    print(
+        f"{result['backend']:<24} items={result['items']:<8,} "
+        f"time={result['seconds_per_render'] * 1000:>10.3f}ms "
+        f"peak={result['peak_memory_bytes'] / 2**20:>8.2f}MB "
+        f"size={result['output_bytes'] / 1024:>9.1f}KB",
+        file=sys.stderr,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 100, 1000, 10_000, 100_000]
+    )
+    parser.add_argument(
+        "--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS)
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="seconds per timing run"
+    )
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    backends = {name: BACKENDS[name] for name in args.backends}
+    different = check_equivalent(backends, CHECK_ITEMS)
+    if different:
+        print(f"Different HTML: {', '.join(different)}", file=sys.stderr)
+        return 1
+
+    results = run(args.sizes, backends, args.repeat, args.min_time)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "lxml": ".".join(map(str, etree.LXML_VERSION)),
+        "libxml2": ".".join(map(str, etree.LIBXML_VERSION)),
+        "jinja2": jinja2.__version__,
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Compile a view into constant HTML chunks and slots, once at startup.
+
+Most of a page is the same on every request: the `<head>`, the layout, the
+login form. Only a few strings change. `compile_view` renders the view a
+single time with placeholder values, serializes it with `tostring()` and
+splits the result at the placeholders. Rendering a request is then escaping
+the values and joining pre-encoded bytes, no tree is built.
+
+    index = compile_view(
+        view_index,
+        {"title": slot("title"), "items": repeat("items"), "user": slot("user")},
+    )
+    index.render(title="Home", items=["1", "2"], user="@polyrand")
+
+The output is byte-identical to `s(view_index(state)).encode()`. Views that
+branch on the state (e.g. `state.get("error")`) need one compiled view per
+branch. Placeholders can't go inside `<script>` or `<style>`, where lxml
+doesn't escape text, or in URL attributes (`href`, `src`, `action` and
+`name` of `<a>`), where libxml2 percent-encodes them. Both raise
+`ValueError`. In other attributes a placeholder has to be the whole value:
+libxml2 picks the quotes from the value (`'` if it has `"`), so the slot
+writes the quotes too.
+"""
+
+import re
+from html import escape
+from typing import Callable
+
+from lxml.html import HtmlElement
+from lxml.html import tostring
+
+from string_builder import attribute_value
+
+# private use area characters, they never show up in real content
+SLOT_START = "\ue000"
+SLOT_END = "\ue001"
+SLOT_RE = re.compile(f"{SLOT_START}([^{SLOT_END}]+){SLOT_END}")
+
+# second placeholder of a `repeat`
+REPEAT_MARK = "#1"
+
+RAW_TEXT_TAGS = {"script", "style"}
+# libxml2 percent-encodes non-ASCII characters in these
+URI_ATTRIBUTES = {"href", "src", "action"}
+
+
+def slot(name: str) -> str:
+    """
+    Placeholder for a string, used as text or as a whole attribute value
+    (but not a URL one).
+    """
+    return f"{SLOT_START}{name}{SLOT_END}"
+
+
+def repeat(name: str) -> list[str]:
+    """
+    Placeholder for a list the view loops over, e.g. `[e.li(x) for x in
+    items]`. Two placeholders tell us what is repeated for each item.
+    """
+    return [slot(name), slot(name + REPEAT_MARK)]
+
+
+def _text_escape(value: str) -> str:
+    return escape(value, quote=False)
+
+
+def _slot_contexts(tree: HtmlElement) -> dict[str, Callable[[str], str]]:
+    """
+    Escape function for each placeholder, depending on where it is.
+    """
+    escapes = {}
+
+    def add(name: str, escape_value: Callable[[str], str]) -> None:
+        if escapes.setdefault(name, escape_value) is not escape_value:
+            raise ValueError(f"Slot {name!r} is used in text and in an attribute.")
+
+    for el in tree.iter():
+        for attr, value in el.attrib.items():
+            names = SLOT_RE.findall(value)
+            if names and (
+                attr.lower() in URI_ATTRIBUTES
+                or (attr.lower() == "name" and el.tag == "a")
+            ):
+                raise ValueError(
+                    f"Slot {names[0]!r} is in the URL attribute {attr!r} of "
+                    f"<{el.tag}>."
+                )
+            if names and value != slot(names[0]):
+                raise ValueError(
+                    f"Slot {names[0]!r} isn't the whole value of {attr!r} of "
+                    f"<{el.tag}>."
+                )
+            for name in names:
+                add(name, attribute_value)
+
+        for text, parent in ((el.text, el), (el.tail, el.getparent())):
+            names = SLOT_RE.findall(text or "")
+            if names and parent is not None and parent.tag in RAW_TEXT_TAGS:
+                raise ValueError(f"Slot {names[0]!r} is inside <{parent.tag}>.")
+            for name in names:
+                add(name, _text_escape)
+
+    return escapes
+
+
+class CompiledView:
+    def __init__(self, tree: HtmlElement, doctype: str | None = "<!DOCTYPE html>"):
+        escapes = _slot_contexts(tree)
+        parts = SLOT_RE.split(tostring(tree, encoding="unicode", doctype=doctype))
+
+        # `parts` alternates constant HTML and slot names. The two
+        # placeholders of a `repeat` become a single step with the HTML
+        # around one item.
+        self.chunks = [parts[0].encode()]
+        self.steps = []
+        i = 1
+        while i < len(parts):
+            name, after = parts[i], parts[i + 1]
+            if i + 2 < len(parts) and parts[i + 2] == name + REPEAT_MARK:
+                between, end = after, parts[i + 3]
+                prefix, suffix = _split_repeated(self.chunks[-1], between, end)
+                self.chunks[-1] = self.chunks[-1][: len(self.chunks[-1]) - len(prefix)]
+                self.steps.append((name, escapes[name], prefix, suffix))
+                self.chunks.append(end.encode()[len(suffix) :])
+                i += 4
+            else:
+                if escapes[name] is attribute_value:
+                    # lxml quoted the placeholder with `"`, the value brings
+                    # its own quotes
+                    self.chunks[-1] = self.chunks[-1].removesuffix(b'"')
+                    after = after.removeprefix('"')
+                self.steps.append((name, escapes[name], None, None))
+                self.chunks.append(after.encode())
+                i += 2
+
+        self.slots = [name for name, *_ in self.steps]
+        # e.g. a placeholder that the serializer changed
+        found = set(self.slots)
+        found.update(
+            name + REPEAT_MARK
+            for name, _, prefix, _ in self.steps
+            if prefix is not None
+        )
+        missing = escapes.keys() - found
+        if missing:
+            raise ValueError(f"Slots not found in the HTML: {sorted(missing)}.")
+
+    def render(self, **values) -> bytes:
+        chunks = self.chunks
+        out = [chunks[0]]
+        for i, (name, escape_value, prefix, suffix) in enumerate(self.steps, 1):
+            value = values[name]
+            if prefix is None:
+                out.append(escape_value(value).encode())
+            else:
+                out.extend(
+                    b"".join((prefix, escape_value(item).encode(), suffix))
+                    for item in value
+                )
+            out.append(chunks[i])
+
+        return b"".join(out)
+
+
+def _split_repeated(before: bytes, between: str, after: str) -> tuple[bytes, bytes]:
+    """
+    With `[A, B]` as placeholders the view renders `...<li>A</li><li>B</li>...`.
+    `between` (`</li><li>`) is what goes after one item (a prefix of `after`)
+    followed by what goes before the next one (a suffix of `before`). The
+    list should be the only content of its parent element, or the split can
+    be ambiguous.
+    """
+    between = between.encode()
+    after = after.encode()
+    for i in range(len(between) + 1):
+        suffix, prefix = between[:i], between[i:]
+        if after.startswith(suffix) and before.endswith(prefix):
+            return prefix, suffix
+
+    raise ValueError("The view doesn't repeat the same HTML for every item.")
+
+
+def compile_view(
+    view: Callable[..., HtmlElement],
+    state: dict,
+    doctype: str | None = "<!DOCTYPE html>",
+) -> CompiledView:
+    """
+    Render `view(state)` with the placeholders in `state` and compile it.
+    """
+    return CompiledView(view(state), doctype=doctype)
@@ -0,0 +1,17 @@
+"""
+The filters of `data_structures/`, for the modules of this directory.
+`data_structures` isn't a package, so its directory goes on `sys.path` here,
+once, instead of in every module that needs a filter.
+
+    from filters import BloomFilter
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "data_structures"))
+
+from bloom_filters import BloomFilter  # noqa: E402
+from sliding_bloom import SlidingBloomFilter  # noqa: E402
+
+__all__ = ["BloomFilter", "SlidingBloomFilter"]
@@ -0,0 +1,195 @@
+"""
+In-process load test for the apps: requests go straight to the ASGI `app`
+through `httpx.ASGITransport`, no uvicorn or sockets involved.
+
+For every app and route it reports:
+
+- req/s and p50/p95/p99 latency with `--concurrency` requests in flight
+- CPU time per request (`time.process_time()`, client included)
+- memory allocated per request, the tracemalloc peak of a request run on
+  its own. tracemalloc doesn't see libxml2's allocations, so this is the
+  Python side of rendering only
+
+Routes an app doesn't have (404) are skipped. With `--baseline` the run
+exits with 1 if a route got slower than in a previous `--output` file.
+
+    python loadtest.py app-full app-class --requests 2000 --concurrency 16
+    python loadtest.py --output before.json
+    python loadtest.py --baseline before.json --max-regression 0.2
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+import httpx
+
+from render_pool import percentiles
+
+APPS = ["app-basic", "app-state", "app-full", "app-class", "app-daisyui"]
+ROUTES = ["/", "/error", "/?error=true"]
+
+
+async def _load(client: httpx.AsyncClient, route: str, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed() -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(route)
+            elapsed = time.perf_counter() - start
+        response.raise_for_status()
+        return elapsed
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*[timed() for _ in range(requests)])
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    return elapsed, cpu, latencies
+
+
+async def _allocations(client: httpx.AsyncClient, route: str, requests: int) -> float:
+    """
+    Mean tracemalloc peak of `requests` requests sent one at a time, in
+    bytes. Runs separately from the timed load, tracemalloc slows everything
+    down.
+    """
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(requests):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            response = await client.get(route)
+            _, peak = tracemalloc.get_traced_memory()
+            response.raise_for_status()
+            peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+
+    return statistics.mean(peaks)
+
+
+async def load_app(module, routes: list[str], args) -> list[dict]:
+    app = module.app
+    transport = httpx.ASGITransport(app=app)
+    results = []
+
+    # ASGITransport doesn't send lifespan events, app-class sets its
+    # renderer up there
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://app"
+        ) as client:
+            for route in routes:
+                response = await client.get(route)
+                if response.status_code == 404:
+                    continue
+                response.raise_for_status()
+
+                for _ in range(args.warmup):
+                    await client.get(route)
+
+                elapsed, cpu, latencies = await _load(
+                    client, route, args.requests, args.concurrency
+                )
+                allocated = await _allocations(client, route, args.alloc_requests)
+                p = percentiles([latency * 1000 for latency in latencies])
+                results.append(
+                    {
+                        "app": module.__name__,
+                        "route": route,
+                        "requests": args.requests,
+                        "concurrency": args.concurrency,
+                        "req_per_s": args.requests / elapsed,
+                        "p50_ms": p["p50"],
+                        "p95_ms": p["p95"],
+                        "p99_ms": p["p99"],
+                        "cpu_ms_per_request": cpu / args.requests * 1000,
+                        "alloc_kb_per_request": allocated / 1024,
+                        "response_bytes": len(response.content),
+                    }
+                )
+
+    return results
+
+
+def print_row(r: dict) -> None:
+    print(
+        f"{r['app']:<12} {r['route']:<13} "
+        f"req/s={r['req_per_s']:>7,.0f} "
+        f"p50={r['p50_ms']:7.2f}ms p95={r['p95_ms']:7.2f}ms p99={r['p99_ms']:7.2f}ms "
+        f"cpu={r['cpu_ms_per_request']:6.3f}ms alloc={r['alloc_kb_per_request']:7.1f}KB",
+        file=sys.stderr,
+    )
+
+
+def regressions(results: list[dict], baseline: list[dict], max_regression: float):
+    """
+    Routes whose p95 latency or CPU time per request grew more than
+    `max_regression` (0.2 = 20%) over the baseline.
+    """
+    before = {(r["app"], r["route"]): r for r in baseline}
+    for r in results:
+        old = before.get((r["app"], r["route"]))
+        if old is None:
+            continue
+        for metric in ("p95_ms", "cpu_ms_per_request"):
+            if r[metric] > old[metric] * (1 + max_regression):
+                yield r["app"], r["route"], metric, old[metric], r[metric]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="In-process load test of the apps.")
+    parser.add_argument("apps", nargs="*", default=APPS)
+    parser.add_argument("--routes", nargs="+", default=ROUTES)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument(
+        "--alloc-requests",
+        type=int,
+        default=50,
+        help="requests traced with tracemalloc, one at a time",
+    )
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--baseline", help="JSON of a previous run to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = []
+    for name in args.apps:
+        module = importlib.import_module(name.removesuffix(".py"))
+        for r in asyncio.run(load_app(module, args.routes, args)):
+            print_row(r)
+            results.append(r)
+
+    report = {"results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        slower = list(regressions(results, baseline, args.max_regression))
+        for app, route, metric, old, new in slower:
+            print(f"{app} {route}: {metric} {old:.3f} -> {new:.3f}", file=sys.stderr)
+        if slower:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
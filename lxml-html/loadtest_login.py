@@ -0,0 +1,110 @@
+"""
+Load test for `POST /login`: send a mix of existing and unknown emails and
+count how many lookups reach the user store, with and without the Bloom
+filter in front of it.
+
+    python loadtest_login.py app-full --requests 5000 --known 0.1
+"""
+
+import argparse
+import asyncio
+import importlib
+import random
+import sys
+import time
+
+import httpx
+
+
+async def send_logins(app, emails: list[str], concurrency: int) -> int:
+    """
+    POST every email to `/login` and return how many got "Wrong
+    credentials!".
+    """
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+
+        async def login(email: str) -> bool:
+            async with semaphore:
+                response = await client.post("/login", data={"email": email})
+            response.raise_for_status()
+            return "Wrong credentials!" in response.text
+
+        results = await asyncio.gather(*[login(email) for email in emails])
+
+    return sum(results)
+
+
+async def run(module, emails: list[str], concurrency: int, use_filter: bool) -> dict:
+    users = module.users
+    users.use_filter = use_filter
+    queries_before = users.store.queries
+    filtered_before = users.filtered
+
+    start = time.perf_counter()
+    rejected = await send_logins(module.app, emails, concurrency)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "use_filter": use_filter,
+        "requests": len(emails),
+        "rejected": rejected,
+        "store_queries": users.store.queries - queries_before,
+        "filtered": users.filtered - filtered_before,
+        "seconds": elapsed,
+    }
+
+
+async def run_both(module, args) -> list[dict]:
+    # app-class builds its users in the lifespan, which ASGITransport
+    # doesn't run
+    async with module.app.router.lifespan_context(module.app):
+        num_users = module.users.store.count()
+
+        rng = random.Random(0)
+        emails = [
+            (
+                f"user{rng.randrange(num_users)}@example.com"
+                if rng.random() < args.known
+                else f"nobody{i}@example.com"
+            )
+            for i in range(args.requests)
+        ]
+
+        return [
+            await run(module, emails, args.concurrency, use_filter=False),
+            await run(module, emails, args.concurrency, use_filter=True),
+        ]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test POST /login.")
+    parser.add_argument("app", nargs="?", default="app-full")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument(
+        "--known", type=float, default=0.1, help="share of existing emails"
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    module = importlib.import_module(args.app.removesuffix(".py"))
+    results = asyncio.run(run_both(module, args))
+    for r in results:
+        print(
+            f"filter={'on ' if r['use_filter'] else 'off'} "
+            f"requests={r['requests']} rejected={r['rejected']} "
+            f"store_queries={r['store_queries']} filtered={r['filtered']} "
+            f"req/s={r['requests'] / r['seconds']:,.0f}"
+        )
+
+    if results[0]["rejected"] != results[1]["rejected"]:
+        print("The filter changed some responses!", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+LRU cache of rendered pages with a Bloom filter "doorkeeper" (TinyLFU,
+Einziger et al., 2017).
+
+Most URLs are requested once (unique query strings, crawlers), and with a
+plain LRU each of them evicts a page that would have been requested again.
+Here a page is only admitted the second time it's requested within the
+doorkeeper window. The doorkeeper remembers keys it has seen in a
+`SlidingBloomFilter`, so it uses a few bits per key and forgets old keys on
+its own.
+
+    python page_cache.py --requests 50000 --max-bytes 2000000
+"""
+
+import argparse
+import importlib
+import random
+import sys
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Callable
+
+from filters import SlidingBloomFilter
+
+
+class PageCache:
+    def __init__(
+        self,
+        max_bytes: int,
+        max_entries: int | None = None,
+        admission_window: int | None = 10_000,
+        proba_false_positives=0.01,
+    ):
+        """
+        Pages are evicted in LRU order when the cache holds more than
+        `max_bytes` of HTML or more than `max_entries` pages.
+
+        The doorkeeper remembers between `admission_window` and twice that
+        many distinct keys. Use `admission_window=None` for a plain LRU.
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.doorkeeper = None
+        if admission_window is not None:
+            self.doorkeeper = SlidingBloomFilter(
+                admission_window, proba_false_positives, generations=2
+            )
+
+        self.pages = OrderedDict()
+        self.size = 0
+        # `get` and `put` move and evict entries, one thread at a time
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.admissions = 0
+        # pages not admitted because it was their first request
+        self.rejections = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            html = self.pages.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+
+            self.pages.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key: str, html: str) -> bool:
+        """
+        Offer a rendered page to the cache. Returns whether it was admitted.
+        """
+        size = len(html)
+        with self.lock:
+            if key in self.pages:
+                self.size -= len(self.pages.pop(key))
+            elif self.doorkeeper is not None and not self.doorkeeper.seen(key.encode()):
+                self.rejections += 1
+                return False
+
+            if size > self.max_bytes:
+                return False
+
+            self.pages[key] = html
+            self.size += size
+            self.admissions += 1
+            self._evict()
+            return True
+
+    def _evict(self) -> None:
+        while self.size > self.max_bytes or (
+            self.max_entries is not None and len(self.pages) > self.max_entries
+        ):
+            _, html = self.pages.popitem(last=False)
+            self.size -= len(html)
+            self.evictions += 1
+
+    def get_or_render(self, key: str, render: Callable[[], str]) -> str:
+        html = self.get(key)
+        if html is None:
+            html = render()
+            self.put(key, html)
+        return html
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "admissions": self.admissions,
+                "rejections": self.rejections,
+                "evictions": self.evictions,
+                "entries": len(self.pages),
+                "bytes": self.size,
+            }
+
+
+def simulate(cache: PageCache, keys: list[str], render: Callable[[str], str]) -> dict:
+    for key in keys:
+        cache.get_or_render(key, lambda: render(key))
+    return cache.stats()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Page cache with and without admission."
+    )
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--hot-pages", type=int, default=500)
+    parser.add_argument(
+        "--one-hit", type=float, default=0.5, help="share of unique requests"
+    )
+    parser.add_argument("--max-bytes", type=int, default=500_000)
+    args = parser.parse_args()
+
+    app = importlib.import_module("app-full")
+
+    def render(key: str) -> str:
+        state = {"title": key, "items": [key] * 4, "user": "@polyrand"}
+        return app.s(app.view_index(MappingProxyType(state)))
+
+    # hot pages follow a Zipf-like popularity, the rest are never repeated
+    rng = random.Random(0)
+    weights = [1 / (i + 1) for i in range(args.hot_pages)]
+    hot = rng.choices(range(args.hot_pages), weights, k=args.requests)
+    keys = [
+        f"/?q=unique-{i}" if rng.random() < args.one_hit else f"/?page={hot[i]}"
+        for i in range(args.requests)
+    ]
+
+    for name, window in [("lru", None), ("lru+doorkeeper", 10_000)]:
+        cache = PageCache(args.max_bytes, admission_window=window)
+        stats = simulate(cache, keys, render)
+        print(
+            f"{name:<15} hit_ratio={stats['hit_ratio']:.3f} "
+            f"admissions={stats['admissions']:,} rejections={stats['rejections']:,} "
+            f"evictions={stats['evictions']:,} entries={stats['entries']:,}"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
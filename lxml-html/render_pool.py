@@ -0,0 +1,160 @@
+"""
+Render pages in a pool of processes instead of FastAPI's thread pool.
+
+Building a tree with `e.*` and serializing it holds the GIL, so with the
+thread pool every uvicorn worker renders one page at a time. With a
+`RenderPool` the endpoint sends the state to a warm process, where the app
+module is already imported, and awaits the HTML bytes.
+
+The view must be a module-level function (it's pickled by name) and the
+state must be picklable. `MappingProxyType` isn't, so the state is sent as a
+dict and wrapped again in the worker.
+
+    python render_pool.py app-class --workers 4 --items 10 1000 10000
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import MappingProxyType
+from typing import Callable
+from typing import Iterable
+
+from lxml.html import tostring
+from starlette.concurrency import run_in_threadpool
+
+
+def render_page(view: Callable, state: dict) -> bytes:
+    """
+    `s(view(state))` as UTF-8 bytes.
+    """
+    tree = view(MappingProxyType(state))
+    return tostring(tree, encoding="unicode", doctype="<!DOCTYPE html>").encode()
+
+
+def _preload(modules: Iterable[str]) -> None:
+    for name in modules:
+        importlib.import_module(name)
+
+
+def _pid() -> int:
+    return os.getpid()
+
+
+class InlineRenderer:
+    """
+    Render in FastAPI's thread pool, same as a sync endpoint.
+    """
+
+    async def render(self, view: Callable, state) -> bytes:
+        return await run_in_threadpool(render_page, view, dict(state))
+
+    def close(self) -> None:
+        pass
+
+
+class RenderPool:
+    def __init__(self, workers: int | None = None, preload: Iterable[str] = ()):
+        """
+        `preload` are the modules with the views, imported by every worker
+        when it starts instead of on its first page.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(
+            self.workers, initializer=_preload, initargs=(tuple(preload),)
+        )
+        # start all the processes now, not on the first requests
+        futures = [self.executor.submit(_pid) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    async def render(self, view: Callable, state) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, render_page, view, dict(state))
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+
+def make_renderer(workers: int, preload: Iterable[str] = ()):
+    """
+    `RenderPool` if `workers` > 0, `InlineRenderer` otherwise. Call it at
+    startup (e.g. in the app's lifespan), not at import time: the workers
+    may import the app module again.
+    """
+    if workers > 0:
+        return RenderPool(workers, preload)
+    return InlineRenderer()
+
+
+def percentiles(latencies: list[float]) -> dict:
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50": quantiles[49], "p95": quantiles[94], "p99": quantiles[98]}
+
+
+async def _run(renderer, view, states: list[dict], concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(state: dict) -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            await renderer.render(view, state)
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*[timed(state) for state in states])
+
+
+def bench(
+    renderer, view, states: list[dict], concurrency: int
+) -> tuple[float, list[float]]:
+    start = time.perf_counter()
+    latencies = asyncio.run(_run(renderer, view, states, concurrency))
+    return time.perf_counter() - start, latencies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inline vs pooled rendering.")
+    parser.add_argument("app", nargs="?", default="app-class")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    module = importlib.import_module(args.app.removesuffix(".py"))
+    view = module.view_index
+    renderers = {
+        "inline": InlineRenderer(),
+        "pooled": RenderPool(args.workers, preload=[module.__name__]),
+    }
+
+    print(f"{os.cpu_count()} CPUs, {args.workers} render workers")
+    for num_items in args.items:
+        state = {
+            "title": "Some title",
+            "items": [str(i % 100) for i in range(num_items)],
+        }
+        states = [state] * args.requests
+
+        for name, renderer in renderers.items():
+            elapsed, latencies = bench(renderer, view, states, args.concurrency)
+            p = percentiles([latency * 1000 for latency in latencies])
+            print(
+                f"items={num_items:<7,} {name:<7} "
+                f"pages/s={args.requests / elapsed:>9,.0f} "
+                f"p50={p['p50']:8.2f}ms p95={p['p95']:8.2f}ms p99={p['p99']:8.2f}ms"
+            )
+
+    for renderer in renderers.values():
+        renderer.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Builder with the same API as `lxml.html.builder.E` that writes HTML strings
+directly, without building a libxml2 tree.
+
+    from string_builder import E as e
+    from string_builder import s
+
+    s(e.html(ATTR(lang="en"), e.body(e.p("Hello <world>"))))
+
+`e.tag(...)` takes strings, `ATTR()` dicts, keyword attributes, other
+elements and callables, like lxml's builder, and returns an `Element` that
+only holds a list of string chunks. Nesting an element copies its chunks into
+the parent. The output follows libxml2's HTML serializer, so it's the same
+as `tostring(tree, encoding="unicode")`:
+
+- text is escaped (`&`, `<`, `>`), except in `<script>` and `<style>`
+- void elements (`meta`, `input`, `link`...) have no end tag, and neither
+  does an `<li>` without any children
+- boolean attributes (`checked`, `disabled`...) are written without value
+- URL attributes (`href`, `src`, `action`) get spaces and non-ASCII
+  characters percent-encoded
+- attribute values with `"` but no `'` are quoted with `'`
+- in attribute values, `&{...}` (HTML 4 script entities) and `<!--...-->`
+  (server side includes) are written as they are, not escaped
+
+Unlike lxml, strings with characters that are invalid in XML (e.g. `\\x00`)
+are not rejected.
+"""
+
+import re
+from functools import partial
+from html import escape
+
+VOID_ELEMENTS = frozenset(
+    "area base basefont br col frame hr img input isindex link meta param".split()
+)
+RAW_TEXT_ELEMENTS = frozenset(["script", "style"])
+BOOLEAN_ATTRIBUTES = frozenset(
+    "checked compact declare defer disabled ismap multiple nohref noresize "
+    "noshade nowrap readonly selected".split()
+)
+URI_ATTRIBUTES = frozenset(["href", "action", "src"])
+
+# libxml2 percent-encodes control characters, spaces and non-ASCII in URLs
+URI_UNSAFE_RE = re.compile("[\x00-\x20\x7f-\U0010ffff]+")
+# parts of attribute values libxml2 doesn't escape, odd items of `split()`.
+# It looks for the `-->` right after `<!`, so `<!-->` counts as a comment.
+RAW_ATTRIBUTE_RE = re.compile(r"(&\{[^}]*\}|<!(?=--).*?-->)", re.DOTALL)
+
+
+def _percent_encode(match: re.Match) -> str:
+    return "".join(f"%{byte:02X}" for byte in match.group().encode())
+
+
+def _attribute(tag: str, name: str, value: str) -> str:
+    if not isinstance(value, str):
+        raise TypeError(f"Attribute {name!r} must be a string, not {value!r}.")
+
+    lower_name = name.lower()
+    if lower_name in BOOLEAN_ATTRIBUTES:
+        return f" {name}"
+    if lower_name in URI_ATTRIBUTES or (lower_name == "name" and tag == "a"):
+        value = URI_UNSAFE_RE.sub(_percent_encode, value.lstrip(" \t\n\r"))
+
+    return f" {name}={attribute_value(value)}"
+
+
+def attribute_value(value: str) -> str:
+    """
+    Escaped and quoted attribute value, as libxml2 writes it (URL attributes
+    are percent-encoded before this).
+    """
+    parts = RAW_ATTRIBUTE_RE.split(value)
+    parts[::2] = [escape(part, quote=False) for part in parts[::2]]
+    value = "".join(parts)
+    if '"' in value:
+        if "'" not in value:
+            return f"'{value}'"
+        value = value.replace('"', "&quot;")
+    return f'"{value}"'
+
+
+class Element:
+    __slots__ = ("tag", "chunks")
+
+    def __init__(self, tag: str, chunks: list[str]):
+        self.tag = tag
+        self.chunks = chunks
+
+    def __str__(self) -> str:
+        return "".join(self.chunks)
+
+    def __repr__(self) -> str:
+        return f"<Element {self.tag}>"
+
+
+class ElementMaker:
+    def __call__(self, tag: str, *children, **attrib) -> Element:
+        lower_tag = tag.lower()
+        raw_text = lower_tag in RAW_TEXT_ELEMENTS
+
+        # like lxml, keyword attributes go first and dicts update them
+        attrs = dict(attrib)
+        body = []
+        for child in children:
+            if callable(child):
+                child = child()
+
+            if isinstance(child, str):
+                body.append(child if raw_text else escape(child, quote=False))
+            elif isinstance(child, Element):
+                body.extend(child.chunks)
+            elif isinstance(child, dict):
+                attrs.update(child)
+            else:
+                raise TypeError(
+                    "bad argument type: %s(%r)" % (type(child).__name__, child)
+                )
+
+        start = f"<{tag}"
+        if attrs:
+            start += "".join(
+                _attribute(lower_tag, name, value) for name, value in attrs.items()
+            )
+
+        if lower_tag in VOID_ELEMENTS:
+            # libxml2 drops the content of void elements
+            return Element(tag, [start + ">"])
+        if not body and lower_tag == "li":
+            # libxml2 quirk: `e.li()` is `<li>`, but `e.li("")` is `<li></li>`
+            return Element(tag, [start + ">"])
+
+        return Element(tag, [start + ">", *body, f"</{tag}>"])
+
+    def __getattr__(self, tag: str):
+        # only called the first time, then `e.tag` is a plain attribute
+        if tag.startswith("__"):
+            raise AttributeError(tag)
+        maker = partial(self, tag)
+        self.__dict__[tag] = maker
+        return maker
+
+
+E = ElementMaker()
+
+
+def tostring(element: Element, doctype: str | None = None) -> str:
+    if doctype is None:
+        return str(element)
+    return f"{doctype}\n{element}"
+
+
+def s(element: Element) -> str:
+    """
+    Same as the `s()` of the apps: serialize with the HTML doctype.
+    """
+    return tostring(element, doctype="<!DOCTYPE html>")
@@ -0,0 +1,93 @@
+"""
+User store for the `/login` handlers of the apps. SQLite stands in for the
+real database (in memory by default, so every worker seeds its own copy).
+
+Most login attempts under load are for emails that don't exist (typos, bots,
+scrapers). `UserDirectory` keeps a Bloom filter of all the emails, built at
+startup, and only queries the store when the filter says the email may be
+there. A miss in the filter is definite, so those requests never touch the
+store.
+"""
+
+import sqlite3
+import threading
+from typing import Iterable
+
+from filters import BloomFilter
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def demo_emails(n: int) -> Iterable[str]:
+    return (f"user{i}@example.com" for i in range(n))
+
+
+class UserStore:
+    def __init__(self, path: str = ":memory:"):
+        # FastAPI runs sync endpoints in a thread pool
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("CREATE TABLE IF NOT EXISTS users (email TEXT PRIMARY KEY)")
+        # number of lookups that reached the database
+        self.queries = 0
+
+    def add_many(self, emails: Iterable[str]) -> None:
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO users (email) VALUES (?)",
+                ((normalize_email(email),) for email in emails),
+            )
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def emails(self) -> Iterable[str]:
+        with self.lock:
+            rows = self.conn.execute("SELECT email FROM users").fetchall()
+        return (email for (email,) in rows)
+
+    def exists(self, email: str) -> bool:
+        with self.lock:
+            self.queries += 1
+            row = self.conn.execute(
+                "SELECT 1 FROM users WHERE email = ?", (email,)
+            ).fetchone()
+        return row is not None
+
+
+class UserDirectory:
+    def __init__(self, store: UserStore, proba_false_positives=0.001):
+        """
+        Build the filter with every email in `store`. Users added later have
+        to go through `add()`, or they would be rejected by the filter.
+        """
+        self.store = store
+        self.bloom = BloomFilter(max(store.count(), 1), proba_false_positives)
+        self.bloom.add_many(email.encode() for email in store.emails())
+
+        # set to False to compare against going to the store every time
+        self.use_filter = True
+        # lookups answered by the filter alone
+        self.filtered = 0
+
+    @classmethod
+    def demo(cls, num_users: int = 10_000, path: str = ":memory:") -> "UserDirectory":
+        store = UserStore(path)
+        if store.count() < num_users:
+            store.add_many(demo_emails(num_users))
+        return cls(store)
+
+    def add(self, email: str) -> None:
+        self.store.add_many([email])
+        self.bloom.add(normalize_email(email).encode())
+
+    def exists(self, email: str) -> bool:
+        email = normalize_email(email)
+        if self.use_filter and not self.bloom.query(email.encode()):
+            self.filtered += 1
+            return False
+
+        return self.store.exists(email)